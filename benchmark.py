@@ -0,0 +1,1276 @@
+"""Benchmarks for Secure Password Manager.
+
+Every benchmark runs inside a throwaway temp directory so it never touches
+your real vault or key file.
+
+Usage:
+    py benchmark.py connections [OPS]
+    py benchmark.py import [ROWS]
+    py benchmark.py rotation [ROWS]
+    py benchmark.py search [ROWS] [LOOKUPS]
+    py benchmark.py generator [COUNT]
+    py benchmark.py similarity [PAIRS]
+    py benchmark.py audit [ROWS]
+    py benchmark.py breach [LINES]
+    py benchmark.py startup [BUDGET_MS]
+    py benchmark.py agent [ROWS] [CLIENTS] [REQUESTS]
+    py benchmark.py cache [ROWS] [LOOKUPS]
+    py benchmark.py formats [ROWS]
+    py benchmark.py kdf [TARGET_MS]
+    py benchmark.py stress [PROCESSES] [SECONDS]
+    py benchmark.py migrate [ROWS] [PROCESSES]
+    py benchmark.py backup [ROWS]
+    py benchmark.py profiling [LOOKUPS]
+    py benchmark.py otp [SMTP_DELAY_MS]
+    py benchmark.py strength [WORDS] [COUNT]
+    py benchmark.py suite [SIZES...] [OUTPUT.json]
+    py benchmark.py compare OLD.json NEW.json [THRESHOLD_PCT]
+"""
+import os
+import sys
+import csv
+import hashlib
+import random
+import re
+import statistics
+import string
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+from collections import deque
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+
+def load_manager():
+    """Import the password manager module (call from inside a temp dir)."""
+    import password_manager
+    return password_manager
+
+
+def report(label, ops, seconds):
+    print(f"{label:<40} {ops / seconds:>12,.0f} ops/sec  ({seconds:.3f}s for {ops:,} ops)")
+
+
+# ============================================
+# CONNECTION BENCHMARK
+# ============================================
+def bench_connections(ops=2000):
+    """Compare a connection per operation against the shared WAL connection."""
+    spm = load_manager()
+    spm.init_db()
+    token = spm.encrypt_password("benchmark-password")
+
+    # Old behaviour: connect, run one statement, commit, close
+    start = time.perf_counter()
+    for i in range(ops):
+        conn = sqlite3.connect(spm.DB_FILE)
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO credentials (website, username, password) VALUES (?, ?, ?)",
+            (f"site{i}.com", f"user{i}", token)
+        )
+        conn.commit()
+        conn.close()
+    report("insert, connection per call", ops, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(1, ops + 1):
+        conn = sqlite3.connect(spm.DB_FILE)
+        conn.execute("SELECT * FROM credentials WHERE id = ?", (i,)).fetchone()
+        conn.close()
+    report("select by id, connection per call", ops, time.perf_counter() - start)
+
+    # New behaviour: one long-lived connection with cached statements
+    conn = spm.get_connection()
+    start = time.perf_counter()
+    for i in range(ops):
+        with conn:
+            conn.execute(
+                "INSERT INTO credentials (website, username, password) VALUES (?, ?, ?)",
+                (f"site{i}.com", f"user{i}", token)
+            )
+    report("insert, shared connection", ops, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(1, ops + 1):
+        conn.execute("SELECT * FROM credentials WHERE id = ?", (i,)).fetchone()
+    report("select by id, shared connection", ops, time.perf_counter() - start)
+
+
+# ============================================
+# IMPORT BENCHMARK
+# ============================================
+def write_chrome_export(path, rows):
+    """Write a synthetic Chrome-style password export."""
+    with open(path, "w", newline="") as export_file:
+        writer = csv.writer(export_file)
+        writer.writerow(["name", "url", "username", "password", "note"])
+        for i in range(rows):
+            writer.writerow([f"site{i}.com", f"https://site{i}.com/login", f"user{i}", f"Pa55word!{i}", ""])
+
+
+def write_bitwarden_export(path, rows):
+    """Write a Bitwarden-style JSON export whose items include junk entries. Returns the usable count."""
+    import json
+    items = [{"name": f"site{i}", "login": {"uris": [{"uri": f"https://site{i}.com"}], "username": f"user{i}",
+                                            "password": f"Pa55word!{i}"}} for i in range(rows)]
+    items[1:1] = ["junk", 42, None, ["list"], {"name": "no login"}, {"login": {"uris": ["bad"], "password": "x"}}]
+    with open(path, "w") as export_file:
+        json.dump({"items": items}, export_file)
+    return rows
+
+
+def bench_import(rows=100_000):
+    """Import a synthetic Chrome export through the bulk importer.
+
+    A small Bitwarden export with non-object and incomplete items is imported
+    first; exits with status 1 unless exactly its usable entries are added.
+    """
+    spm = load_manager()
+    spm.init_db()
+    expected = write_bitwarden_export("bitwarden.json", 50)
+    count = spm.import_credentials("bitwarden.json", batch_size=7, workers=1)
+    print(f"bitwarden export with junk items: {count} of {expected} usable entries imported")
+    if count != expected:
+        sys.exit(1)
+
+    write_chrome_export("export.csv", rows)
+    start = time.perf_counter()
+    count = spm.import_credentials("export.csv")
+    report(f"bulk import ({os.cpu_count()} workers)", count, time.perf_counter() - start)
+
+
+# ============================================
+# KEY ROTATION BENCHMARK
+# ============================================
+def fill_vault(spm, rows, password="Pa55word!"):
+    """Insert synthetic rows quickly (they all share one ciphertext)."""
+    token = spm.encrypt_password(password)
+    conn = spm.get_connection()
+    with conn:
+        conn.executemany(
+            "INSERT INTO credentials (website, username, password) VALUES (?, ?, ?)",
+            ((f"site{i}.com", f"user{i}", token) for i in range(rows))
+        )
+
+
+def bench_rotation(rows=1_000_000):
+    """Rotate the key of a synthetic vault."""
+    spm = load_manager()
+    spm.init_db()
+    fill_vault(spm, rows)
+
+    start = time.perf_counter()
+    count = spm.rotate_key()
+    report(f"key rotation ({os.cpu_count()} workers)", count, time.perf_counter() - start)
+
+
+# ============================================
+# SEARCH BENCHMARK
+# ============================================
+def bench_search(rows=100_000, lookups=2000):
+    """Time search_credentials() and check a prefix match beats many substring matches.
+
+    The vault gets 1,000 mygitlabN.com rows and one github.com row, so 'git'
+    matches far more rows than the full-text lookup keeps. github.com must
+    still come first. Exits with status 1 if it does not.
+    """
+    spm = load_manager()
+    spm.init_db()
+    fill_vault(spm, rows)
+    token = spm.encrypt_password("Pa55word!")
+    conn = spm.get_connection()
+    with conn:
+        conn.executemany("INSERT INTO credentials (website, username, password) VALUES (?, ?, ?)",
+                         [(f"mygitlab{i}.com", f"dev{i}", token) for i in range(1000)] +
+                         [("github.com", "octocat", token)])
+
+    rng = random.Random(5)
+    start = time.perf_counter()
+    for _ in range(lookups):
+        spm.search_credentials(f"site{rng.randrange(rows)}", 5)
+    report("search, exact site", lookups, time.perf_counter() - start)
+    start = time.perf_counter()
+    for _ in range(lookups // 10):
+        results = spm.search_credentials("git")
+    report("search 'git' (1,001 matches)", lookups // 10, time.perf_counter() - start)
+
+    print(f"top result for 'git': {results[0][1] if results else None}")
+    if not results or results[0][1] != "github.com":
+        print("github.com was not ranked first")
+        sys.exit(1)
+
+
+# ============================================
+# PASSWORD GENERATOR BENCHMARK
+# ============================================
+def legacy_generate_password(spm, username=""):
+    """The old rejection-loop generator, kept here as the baseline."""
+    from difflib import SequenceMatcher
+    special_chars = "!@#$%^&*()-_=+[]{};:,.<>?"
+    all_chars = string.ascii_letters + string.digits + special_chars
+
+    def too_similar(pwd, uname):
+        uname_norm = re.sub(r'[^a-z]', '', uname.lower())
+        pwd_norm = re.sub(r'[^a-z]', '', pwd.lower())
+        if not uname_norm:
+            return False
+        if uname_norm in pwd_norm or pwd_norm in uname_norm:
+            return True
+        return SequenceMatcher(None, uname_norm, pwd_norm).ratio() >= 0.6
+
+    for attempt in range(500):
+        password_chars = [
+            random.choice(string.ascii_lowercase),
+            random.choice(string.ascii_uppercase),
+            random.choice(string.digits),
+            random.choice(special_chars)
+        ]
+        password_chars += random.choices(all_chars, k=random.randint(8, 12))
+        random.shuffle(password_chars)
+        password = "".join(password_chars)
+        strong, _ = spm.check_password_strength(password, username)
+        if strong and not too_similar(password, username):
+            return password
+        if attempt > 200 and strong:
+            return password
+    return "".join(random.choices(all_chars, k=16))
+
+
+def bench_generator(count=5000):
+    """Compare the old rejection loop with the construct-by-design generator.
+
+    Also checks that passwords generated without letters are never rejected
+    as too similar to the username, and exits with status 1 if one is.
+    """
+    spm = load_manager()
+    for username in ("bob", "alexander.hamilton.longusername"):
+        passwords = spm.generate_passwords(200, username, lowercase=False, uppercase=False)
+        rejected = sum("too similar" in spm.check_password_strength(p, username)[1] for p in passwords)
+        print(f"no-letter passwords for {username!r} rejected as similar: {rejected}")
+        if rejected:
+            sys.exit(1)
+    for username in ("", "bob", "alexander.hamilton.longusername"):
+        label = f"username={username!r}"
+        start = time.perf_counter()
+        for _ in range(count):
+            legacy_generate_password(spm, username)
+        report(f"legacy generate_password, {label}", count, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for _ in range(count):
+            spm.generate_password(username)
+        report(f"generate_password, {label}", count, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        spm.generate_passwords(count, username)
+        report(f"generate_passwords batch, {label}", count, time.perf_counter() - start)
+
+
+# ============================================
+# SIMILARITY BENCHMARK
+# ============================================
+def legacy_too_similar(username, password):
+    """The old SequenceMatcher-only check, kept here as the baseline."""
+    from difflib import SequenceMatcher
+    user_norm = re.sub(r'[^a-z]', '', username.lower())
+    pass_norm = re.sub(r'[^a-z]', '', password.lower())
+    if not user_norm:
+        return False
+    if user_norm in pass_norm or pass_norm in user_norm:
+        return True
+    return SequenceMatcher(None, user_norm, pass_norm).ratio() >= 0.6
+
+
+def expected_too_similar(username, password):
+    """legacy_too_similar, except that a password with no letters is never similar to a username.
+
+    The old check counted the empty letters-only string as a substring of every username.
+    """
+    return legacy_too_similar(username, password) and bool(re.sub(r'[^a-z]', '', password.lower()))
+
+
+def legacy_ratio(username, password):
+    """The SequenceMatcher ratio legacy_too_similar compares with 0.6."""
+    from difflib import SequenceMatcher
+    return SequenceMatcher(None, re.sub(r'[^a-z]', '', username.lower()),
+                           re.sub(r'[^a-z]', '', password.lower())).ratio()
+
+
+# Hand-picked pairs on both sides of the 0.6 SequenceMatcher ratio
+SIMILARITY_CORPUS = (
+    ("bob", "bobby"), ("bob", "b0b!2024"), ("bob", "boxer"), ("bob", "obo"), ("alice", "alicia"),
+    ("alice", "malice"), ("alice", "aliens"), ("alice", "clientele"), ("alice", "lacie"), ("alice", "elcia"),
+    ("shashank", "shank"), ("shashank", "hashtag"), ("shashank", "sasha"), ("shashank", "shakshuka"),
+    ("mahesh", "mash"), ("mahesh", "maheshwari"), ("mahesh", "ham"), ("mahesh", "hamhash"),
+    ("jerripottulu", "jerry.potter"), ("jerripottulu", "pottery"), ("jerripottulu", "tulip"),
+    ("hamilton", "hamlet"), ("hamilton", "milton"), ("hamilton", "tonhamil"), ("hamilton", "halmiton"),
+    ("abcdef", "abcxyz"), ("abcdef", "abcdxy"), ("abcdef", "fedcba"), ("abcabc", "cbacba"), ("ab", "ba"),
+    ("a", "b"), ("x", "xy"), ("admin", "nimda"), ("admin", "administrator"), ("root", "toor"),
+)
+
+
+def similarity_corpus(rng, usernames):
+    """SIMILARITY_CORPUS plus, for each username, copies edited one letter at a time until nothing is left.
+
+    The edits walk the ratio down through the 0.6 threshold, so most of these
+    pairs sit close to it. The same seed always gives the same corpus.
+    """
+    samples = list(SIMILARITY_CORPUS)
+    for username in usernames:
+        for _ in range(20):
+            letters = list(username)
+            while letters:
+                position = rng.randrange(len(letters))
+                edit = rng.random()
+                if edit < 0.4:
+                    del letters[position]
+                elif edit < 0.7:
+                    letters[position] = rng.choice(string.ascii_lowercase)
+                else:
+                    letters.insert(position, rng.choice(string.ascii_lowercase + string.digits))
+                samples.append((username, "".join(letters)))
+    return samples
+
+
+def bench_similarity(pairs=20000):
+    """Compare the old similarity check with too_similar() and exit non-zero if any verdict differs."""
+    spm = load_manager()
+    rng = random.Random(42)
+    usernames = ["bob", "jerripottulu.shashank", "alexander.hamilton.longusername"]
+    corpus = similarity_corpus(rng, usernames + ["alice", "mahesh", "x" * 12 + "y" * 12])
+    wrong = [(u, p) for u, p in corpus if expected_too_similar(u, p) != spm.too_similar(u, p)]
+    near = sum(abs(legacy_ratio(u, p) - 0.6) < 0.05 for u, p in corpus)
+    print(f"fixed corpus: {len(corpus):,} pairs, {near:,} within 0.05 of the threshold, {len(wrong)} mismatches")
+    for username, password in wrong[:10]:
+        print(f"  mismatch: {username!r} vs {password!r}")
+
+    samples = []
+    for i in range(pairs):
+        username = usernames[i % len(usernames)]
+        if i % 4 == 0:
+            password = username.replace("a", "4") + str(i)  # Deliberately similar
+        else:
+            password = "".join(rng.choices(string.ascii_letters + string.digits + "!@#", k=rng.randint(8, 24)))
+        samples.append((username, password))
+
+    start = time.perf_counter()
+    for username, password in samples:
+        legacy_too_similar(username, password)
+    report("legacy SequenceMatcher check", pairs, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    actual = [spm.too_similar(u, p) for u, p in samples]
+    report("too_similar", pairs, time.perf_counter() - start)
+
+    mismatches = sum(expected_too_similar(u, p) != a for (u, p), a in zip(samples, actual))
+    print(f"verdict mismatches: {mismatches}")
+    if wrong or mismatches:
+        sys.exit(1)
+
+
+# ============================================
+# AUDIT BENCHMARK
+# ============================================
+def fill_vault_realistic(spm, rows, seed=7):
+    """Insert rows with a realistic mix of strong, weak, reused and near-duplicate passwords."""
+    rng = random.Random(seed)
+    reused = [spm.generate_password() for _ in range(50)]
+    passwords = []
+    for i in range(rows):
+        kind = rng.random()
+        if kind < 0.1:
+            passwords.append(rng.choice(reused))
+        elif kind < 0.2:
+            passwords.append(f"Summer{rng.randint(1990, 2030)}!")
+        elif kind < 0.3:
+            passwords.append(rng.choice(["password", "letmein", "qwerty123", "iloveyou"]))
+        else:
+            passwords.append(spm.generate_password())
+    conn = spm.get_connection()
+    with conn:
+        conn.executemany(
+            "INSERT INTO credentials (website, username, password) VALUES (?, ?, ?)",
+            ((f"site{i}.com", f"user{i}", spm.encrypt_password(p)) for i, p in enumerate(passwords))
+        )
+
+
+def bench_audit(rows=100_000):
+    """Audit a synthetic vault."""
+    spm = load_manager()
+    spm.init_db()
+    fill_vault_realistic(spm, rows)
+
+    start = time.perf_counter()
+    result = spm.audit_vault(report_path="audit_report.json")
+    report(f"vault audit ({os.cpu_count()} workers)", rows, time.perf_counter() - start)
+    print(f"weak: {result['weak_count']:,}  reused groups: {result['reused_group_count']:,}  "
+          f"near-duplicate groups: {result['near_duplicate_group_count']:,}")
+
+
+# ============================================
+# BREACH INDEX BENCHMARK
+# ============================================
+def write_pwned_dump(path, lines, known=()):
+    """Write a synthetic Pwned Passwords style dump (random hashes plus `known` passwords)."""
+    rng = random.Random(3)
+    with open(path, "w") as dump:
+        for password in known:
+            dump.write(f"{hashlib.sha1(password.encode()).hexdigest().upper()}:{rng.randint(1, 10**6)}\n")
+        for _ in range(lines):
+            dump.write(f"{rng.getrandbits(160):040X}:{rng.randint(1, 1000)}\n")
+
+
+def check_breach_corpus(spm, seeded=500, others=2000):
+    """Check verdicts on a small index built in many sorted runs. Returns the number of wrong verdicts.
+
+    The dump lists every seeded password twice, in both hex cases, so the
+    merge has duplicates to drop. Unseeded passwords must not be reported.
+    """
+    known = [f"seeded-{i}" for i in range(seeded)]
+    rng = random.Random(11)
+    with open("pwned-small.txt", "w") as dump:
+        for password in known + known:
+            digest = hashlib.sha1(password.encode()).hexdigest()
+            dump.write(f"{digest.upper() if rng.random() < 0.5 else digest}:{rng.randint(1, 100)}\n")
+        for _ in range(others):
+            dump.write(f"{rng.getrandbits(160):040X}:1\n")
+    run_size = spm._SORT_RUN_SIZE
+    spm._SORT_RUN_SIZE = 97  # Many small runs to merge
+    try:
+        count = spm.build_breach_index("pwned-small.txt", "pwned-small.bin")
+    finally:
+        spm._SORT_RUN_SIZE = run_size
+    unseeded = [f"unseeded-{i}" for i in range(seeded)]
+    candidates = known + unseeded
+    expected = [True] * len(known) + [False] * len(unseeded)
+    single = [spm.is_breached(p, "pwned-small.bin") for p in candidates]
+    batch = spm.breached_flags(candidates, "pwned-small.bin")
+    spm._close_breach_index()
+    wrong = sum(a != e for a, e in zip(single, expected)) + sum(a != e for a, e in zip(batch, expected))
+    wrong += count != seeded + others
+    print(f"small corpus: {count:,} hashes, {seeded} seeded, {len(unseeded)} unseeded, {wrong} wrong verdicts")
+    return wrong
+
+
+def bench_breach(lines=1_000_000, lookups=20000):
+    """Build a breach index from a synthetic dump, time lookups and exit non-zero on any wrong verdict."""
+    spm = load_manager()
+    wrong = check_breach_corpus(spm)
+    known = [f"leaked{i}" for i in range(100)]
+    write_pwned_dump("pwned.txt", lines, known)
+
+    start = time.perf_counter()
+    count = spm.build_breach_index("pwned.txt")
+    report("build breach index", count, time.perf_counter() - start)
+
+    candidates = [known[i % len(known)] if i % 2 else f"unknown{i}" for i in range(lookups)]
+    expected = [bool(i % 2) for i in range(lookups)]
+    start = time.perf_counter()
+    flags = [spm.is_breached(p) for p in candidates]
+    elapsed = time.perf_counter() - start
+    report("is_breached", lookups, elapsed)
+    print(f"mean lookup: {elapsed / lookups * 1e6:.1f} us, hits: {sum(flags):,}")
+
+    start = time.perf_counter()
+    batch = spm.breached_flags(candidates)
+    report("breached_flags batch", lookups, time.perf_counter() - start)
+    spm._close_breach_index()
+
+    wrong += sum(a != e for a, e in zip(flags, expected)) + sum(a != e for a, e in zip(batch, expected))
+    print(f"wrong verdicts: {wrong}")
+    if wrong:
+        sys.exit(1)
+
+
+# ============================================
+# STARTUP BENCHMARK
+# ============================================
+STARTUP_BUDGET_MS = 60  # Extra time over a bare interpreter that `generate` may take
+STARTUP_RUNS = 15
+
+
+def median_run_ms(command):
+    """Median wall-clock time of running `command` in a fresh process."""
+    times = []
+    for _ in range(STARTUP_RUNS):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def bench_startup(budget_ms=STARTUP_BUDGET_MS):
+    """Time a cold start and fail if importing is slow or touches the filesystem."""
+    import py_compile
+    # Normally the first run caches password_manager's bytecode; do that here
+    # too, in case PYTHONDONTWRITEBYTECODE is set
+    py_compile.compile(os.path.join(HERE, "password_manager.py"), doraise=True)
+    env = dict(os.environ, PYTHONPATH=HERE)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import password_manager"],
+        env=env, capture_output=True, text=True, check=True
+    )
+    import_us = 0
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == "password_manager":
+            import_us = int(parts[1])
+    print(f"{'import password_manager':<40} {import_us / 1000:>9.1f} ms (cumulative)")
+
+    side_effects = os.listdir(".")
+    if side_effects:
+        print(f"import created files: {side_effects}")
+
+    script = os.path.join(HERE, "SecurePasswordManager.py")
+    baseline = median_run_ms([sys.executable, "-c", "pass"])
+    generate = median_run_ms([sys.executable, script, "generate"])
+    overhead = generate - baseline
+    print(f"{'bare interpreter':<40} {baseline:>9.1f} ms")
+    print(f"{'SecurePasswordManager.py generate':<40} {generate:>9.1f} ms  (+{overhead:.1f} ms, budget {budget_ms} ms)")
+
+    if side_effects or overhead > budget_ms:
+        print("startup budget exceeded")
+        sys.exit(1)
+
+
+# ============================================
+# AGENT LOAD TEST
+# ============================================
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def bench_agent(rows=10000, clients=8, requests=4000):
+    """Load-test the vault agent with concurrent clients and report p50/p99 latency."""
+    spm = load_manager()
+    spm.init_db()
+    fill_vault(spm, rows)
+    script = os.path.join(HERE, "SecurePasswordManager.py")
+    env = dict(os.environ, SPM_MASTER_PASSWORD="1")
+
+    # Baseline: a fresh process per lookup, as scripts did before the agent existed
+    cold = []
+    for i in range(10):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, script, "get", "--id", str(i + 1)], env=env,
+                       check=True, stdout=subprocess.DEVNULL)
+        cold.append((time.perf_counter() - start) * 1000)
+    print(f"{'cold CLI get, median':<40} {statistics.median(cold):>9.2f} ms")
+
+    agent = subprocess.Popen([sys.executable, script, "agent", "--socket", "agent.sock", "--idle-timeout", "0"],
+                             env=env, stdout=subprocess.PIPE, text=True)
+    try:
+        agent.stdout.readline()  # The agent prints one line once it is listening
+        latencies = []
+        latencies_lock = threading.Lock()
+
+        def client(seed):
+            rng = random.Random(seed)
+            local = []
+            with spm.AgentClient("agent.sock") as connection:
+                for n in range(requests // clients):
+                    start = time.perf_counter()
+                    if n % 4 == 3:
+                        connection.request("search", query=f"site{rng.randrange(rows)}", limit=5)
+                    else:
+                        connection.request("get", id=rng.randrange(1, rows + 1))
+                    local.append((time.perf_counter() - start) * 1000)
+            with latencies_lock:
+                latencies.extend(local)
+
+        threads = [threading.Thread(target=client, args=(seed,)) for seed in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        report(f"agent requests ({clients} clients)", len(latencies), time.perf_counter() - start)
+        latencies.sort()
+        print(f"{'agent latency p50 / p99':<40} {percentile(latencies, 0.5):>9.2f} ms / "
+              f"{percentile(latencies, 0.99):.2f} ms")
+    finally:
+        agent.terminate()
+        agent.wait()
+
+
+# ============================================
+# DECRYPTED CACHE BENCHMARK
+# ============================================
+def bench_cache(rows=2000, lookups=50000):
+    """Repeated lookups with a skewed access pattern, for several cache sizes."""
+    spm = load_manager()
+    spm.init_db()
+    fill_vault_realistic(spm, rows)
+    rng = random.Random(11)
+    # Most lookups hit a small set of favourite credentials, like a real session
+    ids = [min(rows, int(rng.paretovariate(1.2))) for _ in range(lookups)]
+
+    for size in (0, 16, 64, 256, 1024):
+        cache = spm.CredentialCache(size)
+        start = time.perf_counter()
+        for credential_id in ids:
+            row = spm.get_credential(credential_id)
+            cache.decrypt(row[0], row[3])
+        elapsed = time.perf_counter() - start
+        stats = cache.stats()
+        report(f"lookup + decrypt, cache size {size}", lookups, elapsed)
+        print(f"{'':<40} hit rate {stats['hits'] / lookups:.1%}, evictions {stats['evictions']:,}")
+        cache.clear()
+
+
+# ============================================
+# RECORD FORMAT BENCHMARK
+# ============================================
+def bench_formats(rows=1_000_000):
+    """Compare Fernet tokens with v2 AES-GCM records: throughput and database size."""
+    spm = load_manager()
+    spm.load_key()
+    keys = spm.load_keys()
+    rng = random.Random(5)
+    passwords = [spm.generate_password(length=rng.randint(10, 20)).encode() for _ in range(min(rows, 10000))]
+    passwords = [passwords[i % len(passwords)] for i in range(rows)]
+
+    for record_format in spm.RECORD_FORMATS:
+        cipher = spm.VaultCipher(keys, record_format)
+        start = time.perf_counter()
+        tokens = [cipher.encrypt(password) for password in passwords]
+        report(f"{record_format} encrypt", rows, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for token in tokens:
+            cipher.decrypt(token)
+        report(f"{record_format} decrypt", rows, time.perf_counter() - start)
+
+        db_path = f"{record_format}.db"
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE credentials (id INTEGER PRIMARY KEY, website TEXT, username TEXT, password BLOB)")
+        with conn:
+            conn.executemany(
+                "INSERT INTO credentials (website, username, password) VALUES (?, ?, ?)",
+                ((f"site{i}.com", f"user{i}", token) for i, token in enumerate(tokens))
+            )
+        conn.close()
+        record_bytes = sum(len(token) for token in tokens)
+        print(f"{record_format + ' size':<40} {os.path.getsize(db_path) / 2**20:>9.1f} MiB database, "
+              f"{record_bytes / rows:.1f} bytes per record")
+
+
+# ============================================
+# MASTER PASSWORD KDF BENCHMARK
+# ============================================
+def bench_kdf(target_ms=250):
+    """Show the scrypt cost curve, calibrate for target_ms and time a real unlock."""
+    spm = load_manager()
+    for exponent in range(14, 19):
+        n = 2 ** exponent
+        start = time.perf_counter()
+        spm._hash_master_password("benchmark", bytes(16), n, spm.KDF_R, spm.KDF_P)
+        print(f"{f'scrypt n=2^{exponent} r={spm.KDF_R}':<40} {(time.perf_counter() - start) * 1000:>9.1f} ms  "
+              f"({128 * n * spm.KDF_R / 2**20:.0f} MiB)")
+
+    start = time.perf_counter()
+    n, r, p, seconds = spm.calibrate_kdf(target_ms / 1000)
+    print(f"{'calibration':<40} {(time.perf_counter() - start) * 1000:>9.1f} ms  -> n=2^{n.bit_length() - 1}, "
+          f"r={r}, p={p} ({seconds * 1000:.1f} ms per unlock)")
+
+    spm.init_db()
+    spm.set_master_password("correct horse", (n, r, p))
+    for label, password, expected in (("unlock, correct password", "correct horse", True),
+                                      ("unlock, wrong password", "wrong", False)):
+        start = time.perf_counter()
+        accepted = spm.verify_master_password(password)
+        print(f"{label:<40} {(time.perf_counter() - start) * 1000:>9.1f} ms")
+        if accepted != expected:
+            print(f"{label}: expected {'accepted' if expected else 'rejected'}")
+            sys.exit(1)
+
+
+# ============================================
+# MULTI-PROCESS STRESS TEST
+# ============================================
+STRESS_HOT_ROWS = 50  # Updates and deletes aim at these IDs so writers really collide
+
+
+def stress_worker(seed, seconds, rows):
+    """One process hammering the shared vault with a mix of reads and optimistic writes."""
+    spm = load_manager()
+    rng = random.Random(seed)
+    counts = {"ops": 0, "conflicts": 0, "locked": 0}
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        kind = rng.random()
+        try:
+            if kind < 0.25:
+                spm.insert_credential(f"stress{seed}.com", f"user{rng.randrange(1000)}", "Str3ss!pass")
+            elif kind < 0.6:
+                row = spm.get_credential(rng.randint(1, STRESS_HOT_ROWS))
+                if row:
+                    time.sleep(0.001)  # Someone is "typing" between the read and the write
+                    if not spm.update_credential_record(row[0], row[1], row[2], "Upd4ted!pass", expected_version=row[4]):
+                        counts["conflicts"] += 1
+            elif kind < 0.65:
+                row = spm.get_credential(rng.randint(STRESS_HOT_ROWS + 1, rows))
+                if row and not spm.delete_credential_record(row[0], expected_version=row[4]):
+                    counts["conflicts"] += 1
+            elif kind < 0.85:
+                row = spm.get_credential(rng.randint(1, rows))
+                if row:
+                    spm.decrypt_password(row[3])
+            else:
+                spm.search_credentials(f"site{rng.randrange(rows)}", 5)
+            counts["ops"] += 1
+        except sqlite3.OperationalError:
+            counts["locked"] += 1
+    return counts
+
+
+def bench_stress(processes=4, seconds=10, rows=5000):
+    """Run several processes against one vault file and check nothing fails or corrupts."""
+    from concurrent.futures import ProcessPoolExecutor
+    spm = load_manager()
+    spm.init_db()
+    fill_vault(spm, rows)
+    spm.close_connections()
+
+    with ProcessPoolExecutor(processes) as pool:
+        results = list(pool.map(stress_worker, range(processes), [seconds] * processes, [rows] * processes))
+    ops = sum(result["ops"] for result in results)
+    conflicts = sum(result["conflicts"] for result in results)
+    locked = sum(result["locked"] for result in results)
+    report(f"mixed operations ({processes} processes)", ops, seconds)
+    print(f"version conflicts detected: {conflicts:,}  'database is locked' errors: {locked:,}")
+
+    conn = spm.get_connection()
+    integrity = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    conn.execute("INSERT INTO credentials_fts (credentials_fts) VALUES ('integrity-check')")
+    print(f"integrity check: {integrity}, search index consistent")
+    if locked or integrity != "ok":
+        sys.exit(1)
+
+
+# ============================================
+# LEGACY UPGRADE CHECK
+# ============================================
+def write_legacy_vault(rows, master="legacy-master"):
+    """Create key.key and a vault exactly as the original version of the program wrote them.
+
+    Returns the {id: password} pairs that were stored.
+    """
+    from cryptography.fernet import Fernet
+    key = Fernet.generate_key()
+    with open("key.key", "wb") as key_file:
+        key_file.write(key)
+    fernet = Fernet(key)
+    conn = sqlite3.connect("password_manager.db")
+    conn.execute('''
+        CREATE TABLE credentials (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            website TEXT NOT NULL,
+            username TEXT NOT NULL,
+            password TEXT NOT NULL
+        )
+    ''')
+    conn.execute("CREATE TABLE master (id INTEGER PRIMARY KEY CHECK (id = 1), password TEXT NOT NULL)")
+    conn.execute("INSERT INTO master (id, password) VALUES (1, ?)", (fernet.encrypt(master.encode()),))
+    rng = random.Random(13)
+    expected = {}
+    for i in range(1, rows + 1):
+        password = "".join(rng.choices(string.ascii_letters + string.digits, k=rng.randint(6, 20)))
+        conn.execute("INSERT INTO credentials (website, username, password) VALUES (?, ?, ?)",
+                     (f"site{i}.com", f"user{i}", fernet.encrypt(password.encode())))
+        expected[i] = password
+    conn.commit()
+    conn.close()
+    return expected
+
+
+def bench_migrate(rows=20000, processes=4):
+    """Upgrade a populated legacy vault from several processes at once and check nothing was lost."""
+    expected = write_legacy_vault(rows)
+    env = dict(os.environ, PYTHONPATH=HERE)
+    start = time.perf_counter()
+    upgraders = [subprocess.Popen([sys.executable, "-c", "import password_manager; password_manager.init_db()"],
+                                  env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+                 for _ in range(processes)]
+    failures = [upgrader.communicate()[1] for upgrader in upgraders if upgrader.wait() != 0]
+    report(f"legacy upgrade ({processes} processes at once)", rows, time.perf_counter() - start)
+    for error in failures:
+        print(error.strip().splitlines()[-1])
+
+    spm = load_manager()
+    conn = spm.get_connection()
+    problems = []
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version != spm.SCHEMA_VERSION:
+        problems.append(f"schema version {version}, expected {spm.SCHEMA_VERSION}")
+    integrity = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    if integrity != "ok":
+        problems.append(f"integrity check: {integrity}")
+    stored = {row[0]: spm.decrypt_password(row[3]) for row in spm.iter_credentials()}
+    if stored != expected:
+        problems.append(f"{sum(stored.get(i) != p for i, p in expected.items()):,} credentials lost or changed")
+    if not spm.verify_master_password("legacy-master"):
+        problems.append("the old master password no longer unlocks the vault")
+    if not spm.search_credentials(f"site{rows}.com"):
+        problems.append("search index was not built for the old rows")
+    spm.close_connections()
+
+    print(f"{len(stored):,} credentials after upgrade, schema version {version}")
+    for problem in problems:
+        print(f"FAILED: {problem}")
+    if failures or problems:
+        sys.exit(1)
+
+# ============================================
+# BACKUP BENCHMARK
+# ============================================
+def peak_memory_mib():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def bench_backup(rows=1_000_000):
+    """Full backup, an incremental after 1% churn, and a restore of the chain into a new vault."""
+    import shutil
+    spm = load_manager()
+    spm.init_db()
+    fill_vault(spm, rows)
+    print(f"{'peak memory after filling the vault':<40} {peak_memory_mib():>9.1f} MiB")
+
+    start = time.perf_counter()
+    full = spm.backup_vault("full.spmbak")
+    report("full backup", full["rows"], time.perf_counter() - start)
+    print(f"{'':<40} {full['bytes'] / 2**20:.1f} MiB archive, peak memory {peak_memory_mib():.1f} MiB")
+
+    conn = spm.get_connection()
+    rng = random.Random(9)
+    with conn:
+        conn.executemany("UPDATE credentials SET version = version + 1 WHERE id = ?",
+                         [(rng.randint(1, rows),) for _ in range(rows // 100)])
+        conn.executemany("DELETE FROM credentials WHERE id = ?", [(rng.randint(1, rows),) for _ in range(rows // 1000)])
+    start = time.perf_counter()
+    incremental = spm.backup_vault("incremental.spmbak")
+    report("incremental backup (1% changed)", incremental["rows"] + incremental["deleted"], time.perf_counter() - start)
+    print(f"{'':<40} {incremental['bytes'] / 2**20:.2f} MiB archive")
+
+    spm.close_connections()
+    os.mkdir("restored")
+    for name in (spm.KEY_FILE, spm.BACKUP_KEY_FILE):
+        shutil.copy(name, "restored")
+    os.chdir("restored")
+    spm.init_db()
+    start = time.perf_counter()
+    restored = spm.restore_backup(["../full.spmbak", "../incremental.spmbak"])
+    report("restore full + incremental", restored["rows"] + restored["deleted"], time.perf_counter() - start)
+    print(f"{'':<40} {spm.count_credentials():,} credentials restored, peak memory {peak_memory_mib():.1f} MiB")
+    spm.close_connections()
+    os.chdir("..")
+
+
+# ============================================
+# PROFILING OVERHEAD BENCHMARK
+# ============================================
+def bench_profiling(lookups=50000):
+    """Lookups with profiling off and then on, to show what the instrumentation costs."""
+    spm = load_manager()
+    spm.init_db()
+    fill_vault_realistic(spm, 2000)
+    ids = [random.randint(1, 2000) for _ in range(lookups)]
+
+    def lookups_run():
+        start = time.perf_counter()
+        for credential_id in ids:
+            row = spm.get_credential(credential_id)
+            spm.credential_cache.decrypt(row[0], row[3])
+        return time.perf_counter() - start
+
+    off = lookups_run()
+    report("lookup + decrypt, profiling off", lookups, off)
+    spm.enable_profiling()
+    on = lookups_run()
+    report("lookup + decrypt, profiling on", lookups, on)
+    print(f"{'':<40} overhead {(on - off) / lookups * 1e6:.2f} us per lookup ({on / off - 1:+.0%})")
+    timers = spm.profile_report()["timers"]
+    for name in ("get_credential", "CredentialCache.decrypt"):
+        print(f"{'':<40} {name}: p50 {timers[name]['p50_ms']:.3f} ms, p99 {timers[name]['p99_ms']:.3f} ms")
+    spm.close_connections()
+
+
+# ============================================
+# OTP BENCHMARK
+# ============================================
+def fake_smtp_server(delay):
+    """A local SMTP stand-in that waits `delay` seconds before each reply, like a slow remote server.
+
+    Returns (server, messages); messages collects the body of every mail received.
+    """
+    import socketserver
+    messages = []
+
+    class Handler(socketserver.StreamRequestHandler):
+        def reply(self, line):
+            time.sleep(delay)
+            self.wfile.write(line.encode() + b"\r\n")
+
+        def handle(self):
+            self.reply("220 localhost fake SMTP")
+            while True:
+                command = self.rfile.readline().decode().strip()
+                verb = command[:4].upper()
+                if not command or verb == "QUIT":
+                    self.reply("221 bye")
+                    return
+                if verb == "DATA":
+                    self.reply("354 end with .")
+                    body = []
+                    for line in iter(self.rfile.readline, b""):
+                        if line.rstrip(b"\r\n") == b".":
+                            break
+                        body.append(line.decode())
+                    messages.append("".join(body))
+                    self.reply("250 queued")
+                elif verb in ("EHLO", "HELO"):
+                    self.reply("250 localhost")
+                else:
+                    self.reply("250 ok")
+
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, messages
+
+
+def bench_otp(delay_ms=200, rounds=5):
+    """Time-to-prompt for an email OTP against a slow local SMTP server, plus TOTP checks."""
+    spm = load_manager()
+    spm.init_db()
+    server, messages = fake_smtp_server(delay_ms / 1000)
+    os.environ.update(SPM_SMTP_HOST="127.0.0.1", SPM_SMTP_PORT=str(server.server_address[1]),
+                      SPM_SMTP_USER="", SPM_SMTP_SENDER="spm@localhost", SPM_SMTP_STARTTLS="0", SPM_SMTP_TIMEOUT="5")
+
+    blocking, prompt, delivered = [], [], []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        spm.send_email_otp("me@example.com")
+        blocking.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        otp, delivery = spm.start_email_otp("me@example.com")
+        prompt.append(time.perf_counter() - start)
+        delivery.result(timeout=30)
+        delivered.append(time.perf_counter() - start)
+        if f"Your OTP is {otp}" not in messages[-1]:
+            raise RuntimeError("the OTP sent is not the one returned")
+    server.shutdown()
+    print(f"{'SMTP reply delay':<40} {delay_ms:>9} ms")
+    print(f"{'blocking send (old time-to-prompt)':<40} {statistics.median(blocking) * 1000:>9.1f} ms")
+    print(f"{'background send, time-to-prompt':<40} {statistics.median(prompt) * 1000:>9.3f} ms")
+    print(f"{'background send, delivered after':<40} {statistics.median(delivered) * 1000:>9.1f} ms")
+
+    secret = b"12345678901234567890"
+    if spm.totp(secret, 59, digits=8) != "94287082":  # RFC 6238 test vector
+        raise RuntimeError("TOTP does not match RFC 6238")
+    spm.set_totp_secret(secret)
+    start = time.perf_counter()
+    for _ in range(1000):
+        spm.verify_totp(spm.totp(secret))
+    report("TOTP reset check (no network)", 1000, time.perf_counter() - start)
+    spm.close_connections()
+
+# ============================================
+# STRENGTH ESTIMATOR BENCHMARK
+# ============================================
+def bench_strength(words=500_000, count=20000):
+    """Build a word index from a synthetic frequency list and time the entropy estimator."""
+    spm = load_manager()
+    rng = random.Random(5)
+    with open("words.txt", "w") as word_list:
+        for _ in range(words):
+            word_list.write("".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 12))) + "\n")
+    start = time.perf_counter()
+    indexed = spm.build_word_index(["words.txt"])
+    print(f"{'build word index':<40} {indexed:,} words in {time.perf_counter() - start:.2f}s, "
+          f"{os.path.getsize(spm.WORD_INDEX_FILE) / 2 ** 20:.1f} MiB")
+
+    for password in ("Password1!", "Summer2024!", "qwertyuiop", "1q2w3e4r5t6y7u8i9o0p", "P@ssw0rd", "24/12/1990",
+                     "the quick brown fox jumps over the lazy dog and keeps on running till dusk"):
+        estimate = spm.estimate_strength(password)
+        print(f"{password[:38]:<40} {estimate['bits']:>6.1f} bits  {'strong' if estimate['bits'] >= spm.STRENGTH_MIN_BITS else 'weak'}")
+
+    # Typing a password: the estimate reruns on every prefix
+    typed = spm.generate_password(length=24)
+    timings = []
+    for end in range(1, len(typed) + 1):
+        for _ in range(50):
+            started = time.perf_counter()
+            spm.estimate_strength(typed[:end])
+            timings.append(time.perf_counter() - started)
+    timings.sort()
+    print(f"{'estimate per keystroke':<40} p50 {percentile(timings, 0.5) * 1000:.3f} ms  "
+          f"p99 {percentile(timings, 0.99) * 1000:.3f} ms")
+
+    passwords = spm.generate_passwords(count // 2) + \
+        [rng.choice(["Password1!", "Summer2024!", "letmein123", "iloveyou2", "dragon1990"]) for _ in range(count // 2)]
+    start = time.perf_counter()
+    for password in passwords:
+        spm.check_password_strength(password, "alice")
+    report("check_password_strength (audit mix)", count, time.perf_counter() - start)
+
+# ============================================
+# BENCHMARK SUITE AND REGRESSION CHECK
+# ============================================
+SUITE_SIZES = (1000, 100_000, 1_000_000)
+SUITE_CRUD_OPS = 200        # Interactive add/list/update/delete runs per vault size
+SUITE_WINDOW = 0.3         # Seconds each throughput round runs for
+SUITE_ROUNDS = 7            # Timed rounds per throughput result, after one warm-up round
+REGRESSION_THRESHOLD = 10   # Percent slower before compare flags a result, unless the runs were noisier
+
+
+def git_revision():
+    """Short commit hash of the tree being measured, marked when it has local changes."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "diff", "--quiet", "HEAD"], cwd=HERE).returncode != 0
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("-dirty" if dirty else "")
+
+
+class ScriptedInput:
+    """Stands in for input() and input_password(), answering prompts from a list.
+
+    "More" prompts from the pager are answered with "q" so only the first page is shown.
+    """
+
+    def __init__(self):
+        self.answers = deque()
+
+    def __call__(self, prompt=""):
+        if prompt.startswith("-- More"):
+            return "q"
+        return self.answers.popleft()
+
+
+def reference_work():
+    """A fixed mix of interpreter and C work, timed next to every result to gauge the machine's speed."""
+    digest = hashlib.sha256(b"spm reference" * 64).digest()
+    return sum(byte * i for i, byte in enumerate(digest))
+
+
+def rate(function, window):
+    """Calls of function() per second over a window of at least window seconds."""
+    ops, start = 0, time.perf_counter()
+    while True:
+        for _ in range(50):
+            function()
+        ops += 50
+        elapsed = time.perf_counter() - start
+        if elapsed >= window:
+            return ops / elapsed
+
+
+def throughput(results, name, function, window=SUITE_WINDOW, rounds=SUITE_ROUNDS):
+    """Store ops/sec of function() under name, from the median of several timed rounds.
+
+    Each round runs function() for window seconds, then reference_work() for a
+    third of that, after one untimed warm-up round. noise_pct is half the
+    spread between the slowest and fastest round, each taken relative to the
+    reference work next to it, and reference_ops_per_sec lets compare cancel
+    out a machine that was faster or slower overall.
+    """
+    rates, references = [], []
+    for round_number in range(rounds + 1):
+        measured, reference = rate(function, window), rate(reference_work, window / 3)
+        if round_number:  # Round 0 warms up caches and the allocator
+            rates.append(measured)
+            references.append(reference)
+    median = statistics.median(rates)
+    relative = [measured / reference for measured, reference in zip(rates, references)]
+    results[name] = {"kind": "throughput", "ops_per_sec": round(median, 1),
+                     "noise_pct": round((max(relative) - min(relative)) / statistics.median(relative) * 50, 2),
+                     "reference_ops_per_sec": round(statistics.median(references), 1)}
+    print(f"{name:<40} {median:>12,.0f} ops/sec  (noise {results[name]['noise_pct']:.1f}%)")
+
+
+def latency(results, name, timings, references, chunks=5):
+    """Store the latency distribution of timings (seconds) under name.
+
+    noise_pct is the spread of the p50 between consecutive chunks of the
+    timings, as a share of the overall p50. references are reference_work()
+    rates taken while the timings were collected.
+    """
+    size = len(timings) // chunks
+    medians = [statistics.median(timings[i * size:(i + 1) * size]) for i in range(chunks)]
+    timings = sorted(timings)
+    p50 = percentile(timings, 0.5)
+    results[name] = {"kind": "latency", "p50_ms": round(p50 * 1000, 4),
+                     "p99_ms": round(percentile(timings, 0.99) * 1000, 4),
+                     "mean_ms": round(statistics.fmean(timings) * 1000, 4),
+                     "noise_pct": round((max(medians) - min(medians)) / p50 * 100, 2),
+                     "reference_ops_per_sec": round(statistics.median(references), 1)}
+    print(f"{name:<40} p50 {results[name]['p50_ms']:>8.3f} ms  p99 {results[name]['p99_ms']:>8.3f} ms  "
+          f"(noise {results[name]['noise_pct']:.1f}%)")
+
+
+def timed_flow(spm, scripted, answers, flow):
+    """Run one interactive menu flow with canned answers and its output discarded."""
+    import contextlib
+    scripted.answers.extend(answers)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        flow()
+        elapsed = time.perf_counter() - start
+    if scripted.answers:
+        raise RuntimeError(f"{flow.__name__} did not use all its answers: {list(scripted.answers)}")
+    return elapsed
+
+
+def bench_suite(*args):
+    """Measure generation, strength checks, encryption and CRUD at several vault sizes and save JSON.
+
+    Integer arguments are the vault sizes, a path argument is where the JSON
+    goes (default benchmark-<commit>.json next to this file). Compare two
+    result files with `py benchmark.py compare OLD.json NEW.json`.
+    """
+    import builtins
+    import json
+    import platform
+    sizes = [arg for arg in args if isinstance(arg, int)] or SUITE_SIZES
+    revision = git_revision()
+    output = next((arg for arg in args if isinstance(arg, str)), os.path.join(HERE, f"benchmark-{revision}.json"))
+    spm = load_manager()
+    spm.init_db()
+    rng = random.Random(3)
+    results = {}
+
+    throughput(results, "generate_password", spm.generate_password)
+    samples = ["password", "Summer2024!", "correcthorsebatterystaple", "Tr0ub4dor&3", "qwerty123"] + \
+              spm.generate_passwords(45)
+    throughput(results, "check_password_strength",
+               lambda: spm.check_password_strength(rng.choice(samples), "alice"))
+    token = spm.encrypt_password(samples[-1])
+    throughput(results, f"encrypt_password ({spm.get_setting('record_format', 'fernet')})",
+               lambda: spm.encrypt_password(rng.choice(samples)))
+    throughput(results, f"decrypt_password ({spm.get_setting('record_format', 'fernet')})",
+               lambda: spm.decrypt_password(token))
+
+    scripted = ScriptedInput()
+    builtins.input = spm.input_password = scripted
+    rows = 0
+    for size in sorted(sizes):
+        fill_vault(spm, size - rows)
+        rows = size
+        password = spm.generate_password()
+        added, listed, updated, deleted, references = [], [], [], [], []
+        for i in range(SUITE_CRUD_OPS):
+            if i % 20 == 0:
+                references.append(rate(reference_work, 0.05))
+            added.append(timed_flow(spm, scripted, [f"bench{i}.com", "alice", password, password], spm.add_credential))
+            listed.append(timed_flow(spm, scripted, [], spm.view_credentials))
+            target, = spm.get_connection().execute(
+                "SELECT id FROM credentials WHERE id >= ? ORDER BY id LIMIT 1", (rng.randint(1, size),)).fetchone()
+            updated.append(timed_flow(spm, scripted, ["", str(target), "", "", password, password],
+                                      spm.update_credential))
+        delete_references = []
+        for i, (credential_id,) in enumerate(spm.get_connection().execute(
+                "SELECT id FROM credentials ORDER BY id DESC LIMIT ?", (SUITE_CRUD_OPS,)).fetchall()):
+            if i % 20 == 0:
+                delete_references.append(rate(reference_work, 0.05))
+            deleted.append(timed_flow(spm, scripted, ["", str(credential_id), "yes"], spm.delete_credential))
+        latency(results, f"add_credential @{size:,}", added, references)
+        latency(results, f"view_credentials @{size:,}", listed, references)
+        latency(results, f"update_credential @{size:,}", updated, references)
+        latency(results, f"delete_credential @{size:,}", deleted, delete_references)
+    spm.close_connections()
+
+    with open(output, "w") as result_file:
+        json.dump({"revision": revision, "python": platform.python_version(), "machine": platform.platform(),
+                   "cpus": os.cpu_count(), "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                   "results": results}, result_file, indent=2)
+    print(f"results saved to {output}")
+
+
+def compare(old_path, new_path, threshold=REGRESSION_THRESHOLD):
+    """Compare two suite result files and exit non-zero if anything got clearly slower.
+
+    Results are first scaled by how much faster the machine ran the reference
+    workload in the new run. A result is then flagged when it is more than
+    threshold% slower and the slowdown is also bigger than the noise measured
+    in the two runs together.
+    """
+    import json
+    with open(old_path) as old_file, open(new_path) as new_file:
+        old, new = json.load(old_file), json.load(new_file)
+    print(f"{old['revision']} -> {new['revision']}")
+    regressions = 0
+    for name, before in old["results"].items():
+        after = new["results"].get(name)
+        if after is None:
+            continue
+        # How much faster the machine itself was during the new run (1.0 for files without a reference)
+        speed = after.get("reference_ops_per_sec", 1) / before.get("reference_ops_per_sec", 1)
+        if before["kind"] == "throughput":
+            # Slowdown in percent, positive when the new run is worse
+            change = (before["ops_per_sec"] * speed / after["ops_per_sec"] - 1) * 100
+            detail = f"{before['ops_per_sec']:>12,.0f} -> {after['ops_per_sec']:>12,.0f} ops/sec"
+        else:
+            change = (after["p50_ms"] * speed / before["p50_ms"] - 1) * 100
+            detail = f"{before['p50_ms']:>10.3f} -> {after['p50_ms']:>10.3f} ms p50"
+        margin = max(threshold, before.get("noise_pct", 0) + after.get("noise_pct", 0))
+        flag = "REGRESSION" if change > margin else ""
+        regressions += bool(flag)
+        print(f"{name:<40} {detail}  machine x{speed:.2f}  {change:+6.1f}% (margin {margin:.0f}%) {flag}")
+    if regressions:
+        print(f"{regressions} result(s) slower by more than their margin")
+        sys.exit(1)
+
+
+BENCHMARKS = {
+    "connections": bench_connections,
+    "import": bench_import,
+    "rotation": bench_rotation,
+    "search": bench_search,
+    "generator": bench_generator,
+    "similarity": bench_similarity,
+    "audit": bench_audit,
+    "breach": bench_breach,
+    "startup": bench_startup,
+    "agent": bench_agent,
+    "cache": bench_cache,
+    "formats": bench_formats,
+    "kdf": bench_kdf,
+    "stress": bench_stress,
+    "migrate": bench_migrate,
+    "backup": bench_backup,
+    "profiling": bench_profiling,
+    "otp": bench_otp,
+    "strength": bench_strength,
+    "suite": bench_suite,
+    "compare": compare,
+}
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print(__doc__)
+        sys.exit(1)
+    # Paths are resolved here, before moving into the temp dir
+    args = [int(arg) if arg.isdigit() else os.path.abspath(arg) for arg in sys.argv[2:]]
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        BENCHMARKS[sys.argv[1]](*args)
+        os.chdir(HERE)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3805 @@
+import os
+import sys
+import re
+import string
+import math
+import functools
+import zlib
+import heapq
+import mmap
+import struct
+import atexit
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import redirect_stdout
+
+# Heavier modules (sqlite3, cryptography, smtplib, difflib, json, csv,
+# hashlib, concurrent.futures, ...) are imported inside the functions that
+# need them, so starting the program or importing this file stays fast.
+
+
+# ============================================
+# PROFILING
+# ============================================
+# Off by default and free when off: enable_profiling() swaps the functions
+# listed below for timed wrappers, so nothing is wrapped unless it is asked
+# for. Turn it on with --profile[=stats.json] / --cprofile=out.prof, or with
+# the SPM_PROFILE / SPM_CPROFILE environment variables. Worker processes used
+# by import, rotation, audit and backup are not profiled.
+PROFILE_ENV = "SPM_PROFILE"
+CPROFILE_ENV = "SPM_CPROFILE"
+PROFILED_FUNCTIONS = (
+    "load_key", "load_cipher", "init_db", "migrate_db", "verify_master_password", "set_master_password",
+    "encrypt_password", "decrypt_password", "generate_passwords", "check_password_strength",
+    "estimate_strength", "is_breached", "too_similar", "get_credential", "search_credentials",
+    "insert_credential", "update_credential_record", "delete_credential_record", "send_email_otp",
+    "verify_totp", "import_credentials", "rotate_key", "convert_records", "audit_vault", "backup_vault",
+    "restore_backup",
+)
+PROFILED_METHODS = (("VaultCipher", "encrypt"), ("VaultCipher", "decrypt"), ("CredentialCache", "decrypt"))
+
+_profile_stats = None  # name -> [calls, total seconds, max seconds, {log2 microsecond bucket: calls}]
+_profile_lock = threading.Lock()
+
+
+def record_timing(name, seconds):
+    bucket = int(seconds * 1e6).bit_length()  # Bucket b holds times below 2**b microseconds
+    with _profile_lock:
+        stat = _profile_stats.get(name)
+        if stat is None:
+            stat = _profile_stats[name] = [0, 0.0, 0.0, {}]
+        stat[0] += 1
+        stat[1] += seconds
+        if seconds > stat[2]:
+            stat[2] = seconds
+        stat[3][bucket] = stat[3].get(bucket, 0) + 1
+
+
+def profile_count(name, amount=1):
+    """Add to a plain counter. Callers check `_profile_stats is not None` first so this costs nothing when off."""
+    with _profile_lock:
+        _profile_stats.setdefault(name, [0, None, None, None])[0] += amount
+
+
+def _timed(name, function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            record_timing(name, time.perf_counter() - start)
+    return wrapper
+
+
+def _profiled_connection_class():
+    """A sqlite3.Connection that times every statement, labelled by its SQL."""
+    import sqlite3
+
+    @functools.lru_cache(maxsize=512)
+    def label(sql):
+        return "sql " + " ".join(sql.split())[:60]
+
+    class ProfiledConnection(sqlite3.Connection):
+        def execute(self, sql, *args):
+            start = time.perf_counter()
+            try:
+                return super().execute(sql, *args)
+            finally:
+                record_timing(label(sql), time.perf_counter() - start)
+
+        def executemany(self, sql, *args):
+            start = time.perf_counter()
+            try:
+                return super().executemany(sql, *args)
+            finally:
+                record_timing(label(sql), time.perf_counter() - start)
+
+        def commit(self):
+            start = time.perf_counter()
+            try:
+                return super().commit()
+            finally:
+                record_timing("sql COMMIT", time.perf_counter() - start)
+
+    return ProfiledConnection
+
+
+def _percentile(buckets, calls, fraction):
+    """Upper bound, in milliseconds, of the histogram bucket holding the given fraction of calls."""
+    seen = 0
+    for bucket in sorted(buckets):
+        seen += buckets[bucket]
+        if seen >= fraction * calls:
+            return (1 << bucket) / 1000
+    return 0.0
+
+
+def profile_report():
+    """The collected timings and counters as a JSON-friendly dict."""
+    report = {"timers": {}, "counters": {}}
+    with _profile_lock:
+        for name, (calls, total, longest, buckets) in sorted(_profile_stats.items()):
+            if total is None:
+                report["counters"][name] = calls
+                continue
+            longest_ms = round(longest * 1000, 3)
+            report["timers"][name] = {
+                "calls": calls, "total_ms": round(total * 1000, 3), "mean_ms": round(total * 1000 / calls, 4),
+                "p50_ms": min(_percentile(buckets, calls, 0.5), longest_ms),
+                "p90_ms": min(_percentile(buckets, calls, 0.9), longest_ms),
+                "p99_ms": min(_percentile(buckets, calls, 0.99), longest_ms), "max_ms": longest_ms,
+                "histogram_us": {f"<{1 << bucket}": count for bucket, count in sorted(buckets.items())},
+            }
+    return report
+
+
+def _print_profile_report():
+    report = profile_report()
+    lines = [f"{'operation':<64} {'calls':>8} {'total ms':>10} {'mean ms':>9} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>9}"]
+    for name, stat in sorted(report["timers"].items(), key=lambda item: -item[1]["total_ms"]):
+        lines.append(f"{name:<64} {stat['calls']:>8,} {stat['total_ms']:>10.1f} {stat['mean_ms']:>9.3f} "
+                     f"{stat['p50_ms']:>8.3f} {stat['p90_ms']:>8.3f} {stat['p99_ms']:>8.3f} {stat['max_ms']:>9.3f}")
+    for name, value in sorted(report["counters"].items()):
+        lines.append(f"{name:<64} {value:>8,}")
+    sys.stderr.write("\n".join(lines) + "\n(p50/p90/p99 are histogram bucket upper bounds, capped at max)\n")
+
+
+def _write_profile_report(path):
+    import json
+    with open(path, "w") as report_file:
+        json.dump(profile_report(), report_file, indent=2)
+
+
+def enable_profiling(json_path=None, cprofile_path=None):
+    """Start timing the hot paths. The summary is printed (or written as JSON) when the program exits."""
+    global _profile_stats
+    if _profile_stats is not None:
+        return
+    _profile_stats = {}
+    module = sys.modules[__name__]
+    for name in PROFILED_FUNCTIONS:
+        setattr(module, name, _timed(name, getattr(module, name)))
+    for class_name, method in PROFILED_METHODS:
+        cls = getattr(module, class_name)
+        setattr(cls, method, _timed(f"{class_name}.{method}", getattr(cls, method)))
+    close_connections()  # Reopened through the timing connection class
+    if json_path:
+        atexit.register(_write_profile_report, json_path)
+    else:
+        atexit.register(_print_profile_report)
+
+    if cprofile_path:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+        def dump():
+            profiler.disable()
+            profiler.dump_stats(cprofile_path)
+        atexit.register(dump)
+
+
+def configure_profiling(argv):
+    """Turn profiling on from --profile[=PATH] / --cprofile=PATH or the environment. Returns argv without those flags."""
+    json_path = os.environ.get(PROFILE_ENV)
+    cprofile_path = os.environ.get(CPROFILE_ENV)
+    remaining = []
+    for arg in argv:
+        if arg == "--profile" or arg.startswith("--profile="):
+            json_path = arg.partition("=")[2] or "1"
+        elif arg.startswith("--cprofile="):
+            cprofile_path = arg.partition("=")[2]
+        else:
+            remaining.append(arg)
+    if json_path or cprofile_path:
+        enable_profiling(None if json_path in (None, "1") else json_path, cprofile_path)
+    return remaining
+
+
+# ============================================
+# PASSWORD INPUT WITH ASTERISKS
+# ============================================
+def input_password(prompt="Enter password: "):
+    """Custom password input that shows '*' for each character typed."""
+    # VS Code terminal often doesn't support real-time masking.
+    if os.getenv("TERM_PROGRAM") == "vscode":
+        return input(prompt)
+
+    password = ""
+    print(prompt, end='', flush=True)
+    # Windows
+    if os.name == 'nt':
+        import msvcrt
+        while True:
+            ch = msvcrt.getch()
+            if ch in {b'\r', b'\n'}:
+                print('')
+                break
+            elif ch == b'\x08':  # Backspace
+                if len(password) > 0:
+                    password = password[:-1]
+                    sys.stdout.write('\b \b')
+                    sys.stdout.flush()
+            elif ch == b'\x03':  # Ctrl+C
+                raise KeyboardInterrupt
+            else:
+                ch = ch.decode(errors="ignore")
+                if ch.isprintable():
+                    password += ch
+                    sys.stdout.write('*')
+                    sys.stdout.flush()
+        # macOS / Linux:
+    else:
+        import termios
+        import tty
+        fd = sys.stdin.fileno()
+        old_settings = termios.tcgetattr(fd)
+        try:
+            tty.setraw(fd)
+            while True:
+                ch = sys.stdin.read(1)
+                if ch in ('\r', '\n'):
+                    print('')
+                    break
+                elif ch == '\x7f':  # Backspace
+                    if len(password) > 0:
+                        password = password[:-1]
+                        sys.stdout.write('\b \b')
+                        sys.stdout.flush()
+                elif ch == '\x03':  # Ctrl+C
+                    raise KeyboardInterrupt
+                else:
+                    password += ch
+                    sys.stdout.write('*')
+                    sys.stdout.flush()
+        finally:
+            termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
+
+    return password
+
+# =================================================
+# ENCRYPTION SETUP
+# =================================================
+KEY_FILE = "key.key"
+PENDING_KEY_FILE = "key.key.new"  # Exists only while a key rotation is in progress
+
+def generate_key():
+    if not os.path.exists(KEY_FILE):
+        from cryptography.fernet import Fernet
+        key = Fernet.generate_key()
+        with open(KEY_FILE, "wb") as key_file:
+            key_file.write(key)
+        print("Encryption key generated and saved.\n")
+
+def load_key():
+    if not os.path.exists(KEY_FILE):
+        generate_key()
+    with open(KEY_FILE, "rb") as key_file:
+        return key_file.read()
+
+def load_keys():
+    """Return the active keys, newest first (two of them during a key rotation)."""
+    keys = []
+    if os.path.exists(PENDING_KEY_FILE):
+        with open(PENDING_KEY_FILE, "rb") as key_file:
+            keys.append(key_file.read())
+    keys.append(load_key())
+    return keys
+
+# Record formats for stored passwords. "fernet" tokens are base64 text with a
+# timestamp and HMAC; "v2" records are raw AES-256-GCM: a 0x02 marker byte,
+# a 12-byte nonce, then the ciphertext and 16-byte tag. Fernet tokens always
+# start with "g", so both formats can live side by side in one table.
+RECORD_FORMATS = ("fernet", "v2")
+DEFAULT_RECORD_FORMAT = "fernet"
+_V2_MARKER = b"\x02"
+_V2_NONCE_SIZE = 12
+
+
+def record_format_of(token):
+    """Which format a stored password record is in."""
+    return "v2" if token[:1] == _V2_MARKER else "fernet"
+
+
+def _v2_key(key):
+    """AES-256 key for v2 records, derived from a key.key value so one key file serves both formats."""
+    import hashlib
+    return hashlib.sha256(b"record-v2" + key).digest()
+
+
+class VaultCipher:
+    """Encrypts new records in one format and decrypts records in either.
+
+    Keys are given newest first, as with MultiFernet: new records use the
+    first key and decryption tries each key, so rows under the old key stay
+    readable during a key rotation.
+    """
+
+    def __init__(self, keys, record_format=DEFAULT_RECORD_FORMAT):
+        from cryptography.exceptions import InvalidTag
+        from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+        if record_format not in RECORD_FORMATS:
+            raise ValueError(f"Unknown record format: {record_format}")
+        self.record_format = record_format
+        self._fernet = Fernet(keys[0]) if len(keys) == 1 else MultiFernet([Fernet(key) for key in keys])
+        self._aead = [AESGCM(_v2_key(key)) for key in keys]
+        self._errors = (InvalidTag, InvalidToken)
+
+    def encrypt(self, data):
+        if self.record_format == "v2":
+            nonce = os.urandom(_V2_NONCE_SIZE)
+            return _V2_MARKER + nonce + self._aead[0].encrypt(nonce, data, None)
+        return self._fernet.encrypt(data)
+
+    def decrypt(self, token):
+        if token[:1] != _V2_MARKER:
+            return self._fernet.decrypt(token)
+        invalid_tag, invalid_token = self._errors
+        nonce, sealed = token[1:1 + _V2_NONCE_SIZE], token[1 + _V2_NONCE_SIZE:]
+        for aead in self._aead:
+            try:
+                return aead.decrypt(nonce, sealed, None)
+            except invalid_tag:
+                continue
+        raise invalid_token
+
+    def rotate(self, token):
+        """Re-encrypt a record under the newest key, in the current record format."""
+        return self.encrypt(self.decrypt(token))
+
+
+def load_cipher():
+    """Build the cipher from the key file(s) and the vault's record format setting."""
+    import sqlite3
+    try:
+        record_format = get_setting("record_format", DEFAULT_RECORD_FORMAT)
+    except sqlite3.OperationalError:
+        record_format = DEFAULT_RECORD_FORMAT  # Vault not created yet
+    return VaultCipher(load_keys(), record_format)
+
+_cipher = None
+
+def get_cipher():
+    """Return the vault cipher, reading the key file the first time it is needed."""
+    global _cipher
+    if _cipher is None:
+        _cipher = load_cipher()
+    return _cipher
+
+def encrypt_password(password):
+    """Encrypt a plaintext password for storage."""
+    return get_cipher().encrypt(password.encode())
+
+def decrypt_password(token):
+    """Decrypt a stored password token back to plaintext."""
+    return get_cipher().decrypt(token).decode()
+
+# ============================================
+# DECRYPTED CREDENTIAL CACHE
+# ============================================
+CACHE_SIZE = 256    # Decrypted passwords kept in memory at most (0 disables the cache)
+CACHE_TTL = 5 * 60  # Seconds a decrypted password may stay in memory
+
+
+class CredentialCache:
+    """LRU cache of decrypted passwords keyed by credential ID, with a time limit per entry.
+
+    Each entry remembers the ciphertext it was decrypted from, so a row that
+    changed in the meantime (even from another process) is decrypted again.
+    Plaintext is held in a bytearray that is overwritten with zeros when the
+    entry is evicted, expires or the cache is cleared. Strings handed back
+    to callers are ordinary Python strings and cannot be wiped.
+    """
+
+    def __init__(self, size=CACHE_SIZE, ttl=CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # id -> (expires_at, token, bytearray plaintext)
+        self._lock = threading.Lock()
+        self._next_sweep = 0
+
+    def decrypt(self, credential_id, token):
+        """Return the plaintext password for a row, decrypting it only on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(credential_id)
+            if entry is not None and entry[1] == token and entry[0] > now:
+                self._entries.move_to_end(credential_id)
+                self.hits += 1
+                return entry[2].decode()
+            self.misses += 1
+            if entry is not None:
+                self._discard(credential_id)
+            if now >= self._next_sweep:
+                self._sweep(now)
+
+        plaintext = bytearray(get_cipher().decrypt(token))
+        password = plaintext.decode()
+        if self.size <= 0:
+            _wipe(plaintext)
+            return password
+        with self._lock:
+            self._discard(credential_id)
+            self._entries[credential_id] = (now + self.ttl, token, plaintext)
+            while len(self._entries) > self.size:
+                _wipe(self._entries.popitem(last=False)[1][2])
+                self.evictions += 1
+        return password
+
+    def invalidate(self, credential_id):
+        """Forget one credential, e.g. after it was updated or deleted."""
+        with self._lock:
+            self._discard(credential_id)
+
+    def clear(self):
+        """Wipe and forget every cached password (used when the vault locks or the program exits)."""
+        with self._lock:
+            while self._entries:
+                _wipe(self._entries.popitem()[1][2])
+
+    def stats(self):
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions}
+
+    def _discard(self, credential_id):
+        entry = self._entries.pop(credential_id, None)
+        if entry is not None:
+            _wipe(entry[2])
+
+    def _sweep(self, now):
+        """Drop expired entries so plaintext does not outlive the TTL just because it is not looked up."""
+        for credential_id in [key for key, entry in self._entries.items() if entry[0] <= now]:
+            self._discard(credential_id)
+        self._next_sweep = now + min(self.ttl, 1)
+
+
+def _wipe(buffer):
+    buffer[:] = bytes(len(buffer))
+
+
+credential_cache = CredentialCache()
+atexit.register(credential_cache.clear)
+
+# ============================================
+# TWO - FACTOR AUTHENTICATION
+# ============================================
+# Reset codes come from the secrets module. Email is sent on a background
+# thread so the prompt shows up at once instead of after the SMTP handshake,
+# and every network step has a timeout. The SMTP server and account are read
+# from SPM_SMTP_HOST, SPM_SMTP_PORT, SPM_SMTP_USER, SPM_SMTP_PASSWORD,
+# SPM_SMTP_SENDER, SPM_SMTP_TIMEOUT and SPM_SMTP_STARTTLS (0 to turn it off).
+# There is no default account: email codes stay off until SPM_SMTP_USER and
+# SPM_SMTP_PASSWORD (or SPM_SMTP_SENDER, for a server without login) are set.
+# An authenticator app (RFC 6238 TOTP) resets the password with no network at all.
+SMTP_HOST = "smtp.gmail.com"
+SMTP_PORT = 587
+SMTP_USER = ""
+SMTP_PASSWORD = ""  # Use an App Password, not your main password
+SMTP_TIMEOUT = 10  # Seconds for each network step
+OTP_DIGITS = 6
+OTP_LIFETIME = 300  # Seconds an emailed code stays valid
+TOTP_STEP = 30
+TOTP_DRIFT = 1      # Codes from this many steps before/after now are accepted too
+TOTP_ISSUER = "Secure Password Manager"
+
+
+def smtp_settings():
+    """The SMTP server and account to send codes from, with the environment taking precedence."""
+    user = os.environ.get("SPM_SMTP_USER", SMTP_USER)
+    return {
+        "host": os.environ.get("SPM_SMTP_HOST", SMTP_HOST),
+        "port": int(os.environ.get("SPM_SMTP_PORT", SMTP_PORT)),
+        "user": user,
+        "password": os.environ.get("SPM_SMTP_PASSWORD", SMTP_PASSWORD),
+        "sender": os.environ.get("SPM_SMTP_SENDER", user),
+        "timeout": float(os.environ.get("SPM_SMTP_TIMEOUT", SMTP_TIMEOUT)),
+        "starttls": os.environ.get("SPM_SMTP_STARTTLS", "1") != "0",
+    }
+
+
+def smtp_configured(settings=None):
+    """True when there is an account or sender address to send codes from."""
+    return bool((settings or smtp_settings())["sender"])
+
+
+def new_otp():
+    import secrets
+    return f"{secrets.randbelow(10 ** OTP_DIGITS):0{OTP_DIGITS}d}"
+
+
+def send_email_otp(receiver_email, otp=None):
+    """Email a one-time code and return it. Blocks until the server accepts the message."""
+    import smtplib
+    otp = otp or new_otp()
+    settings = smtp_settings()
+    if not smtp_configured(settings):
+        raise ValueError("email codes are not set up; set SPM_SMTP_USER and SPM_SMTP_PASSWORD")
+    message = f"From: {settings['sender']}\nTo: {receiver_email}\nSubject: Your OTP Code\n\nYour OTP is {otp}"
+
+    with smtplib.SMTP(settings["host"], settings["port"], timeout=settings["timeout"]) as server:
+        if settings["starttls"]:
+            server.starttls()
+        if settings["user"] and settings["password"]:
+            server.login(settings["user"], settings["password"])
+        server.sendmail(settings["sender"], receiver_email, message)
+
+    return otp
+
+
+def start_email_otp(receiver_email):
+    """Send a one-time code in the background. Returns (otp, future) right away.
+
+    The future's result is the code once the email is accepted, or the error that stopped it.
+    """
+    from concurrent.futures import Future
+    otp = new_otp()
+    delivery = Future()
+
+    def send():
+        try:
+            delivery.set_result(send_email_otp(receiver_email, otp))
+        except Exception as error:  # Reported to the user at the prompt
+            delivery.set_exception(error)
+    threading.Thread(target=send, name="otp-email", daemon=True).start()
+    return otp, delivery
+
+
+def otp_matches(entered, otp, issued_at):
+    """Constant-time check of an emailed code that has not expired yet."""
+    import hmac
+    return time.monotonic() - issued_at <= OTP_LIFETIME and hmac.compare_digest(entered.strip(), otp)
+
+
+def totp(secret, for_time=None, digits=OTP_DIGITS, step=TOTP_STEP):
+    """RFC 6238 time-based code (HMAC-SHA1) for a raw secret."""
+    import hashlib
+    import hmac
+    counter = int((time.time() if for_time is None else for_time) // step)
+    digest = hmac.new(secret, struct.pack(">Q", counter), hashlib.sha1).digest()
+    offset = digest[-1] & 0x0F
+    code = struct.unpack(">I", digest[offset:offset + 4])[0] & 0x7FFFFFFF
+    return f"{code % 10 ** digits:0{digits}d}"
+
+
+def verify_totp(code, now=None):
+    """Check a code from the authenticator app, allowing TOTP_DRIFT steps of clock skew."""
+    import hmac
+    secret = load_totp_secret()
+    if secret is None:
+        return False
+    now = time.time() if now is None else now
+    code = code.strip()
+    return any(hmac.compare_digest(code, totp(secret, now + drift * TOTP_STEP))
+               for drift in range(-TOTP_DRIFT, TOTP_DRIFT + 1))
+
+
+def totp_uri(secret, account="vault"):
+    """otpauth:// URI for adding the secret to an authenticator app."""
+    import base64
+    from urllib.parse import quote
+    key = base64.b32encode(secret).decode().rstrip("=")
+    return (f"otpauth://totp/{quote(TOTP_ISSUER)}:{quote(account)}?secret={key}"
+            f"&issuer={quote(TOTP_ISSUER)}&digits={OTP_DIGITS}&period={TOTP_STEP}")
+
+
+def setup_totp_menu():
+    import base64
+    if load_totp_secret() is not None:
+        if input("An authenticator app is already set up. Type 'remove' to turn it off, "
+                 "or 'new' to replace it: ").strip().lower() == "remove":
+            set_totp_secret(None)
+            print("Authenticator app removed.\n")
+            return
+    secret = os.urandom(20)
+    print("Add this key to your authenticator app (Google Authenticator, Aegis, 1Password, ...):")
+    print(base64.b32encode(secret).decode().rstrip("="))
+    print(f"or scan/open: {totp_uri(secret)}")
+    code = input("Enter the 6-digit code the app shows to confirm: ").strip()
+    if not any(code == totp(secret, time.time() + drift * TOTP_STEP) for drift in range(-TOTP_DRIFT, TOTP_DRIFT + 1)):
+        print("That code does not match. Nothing was changed.\n")
+        return
+    set_totp_secret(secret)
+    print("Authenticator app set up. Its codes can now reset your master password offline.\n")
+
+
+def reset_code_verified():
+    """Ask for an authenticator code or an emailed OTP. True once the user proves who they are."""
+    if load_totp_secret() is not None:
+        code = input("Enter the code from your authenticator app (leave blank to get an email OTP instead): ")
+        if code.strip():
+            if verify_totp(code):
+                return True
+            print("Invalid code.")
+            return False
+
+    if not smtp_configured():
+        print("Email codes are not set up. Set SPM_SMTP_USER and SPM_SMTP_PASSWORD, "
+              "or set up an authenticator app (menu option 10).")
+        return False
+    receiver = input("Enter your email: ")
+    issued_at = time.monotonic()
+    otp, delivery = start_email_otp(receiver)
+    entered = input("Enter the OTP sent to your email: ")
+    if delivery.done() and delivery.exception() is not None:
+        print(f"Could not send the OTP email: {delivery.exception()}")
+        return False
+    if not entered.strip().isdigit():
+        print("Invalid input. OTP should be a number.")
+        return False
+    if otp_matches(entered, otp, issued_at):
+        return True
+    print("Invalid OTP.")
+    return False
+
+
+# ============================================
+# BREACHED PASSWORD CHECK
+# ============================================
+BREACH_INDEX_FILE = "pwned_passwords.bin"
+_BREACH_MAGIC = b"SPMPWND1"
+_HASH_SIZE = 20                 # Raw SHA-1 digest
+_PREFIX_COUNT = 1 << 16         # Index buckets keyed by the first two digest bytes
+_BREACH_HEADER = len(_BREACH_MAGIC) + 8 * (_PREFIX_COUNT + 1)
+_SORT_RUN_SIZE = 5_000_000      # Hashes sorted in memory at once while building (~300 MB: ~61 bytes per hash)
+_HEX_SHA1 = re.compile(rb"^([0-9A-Fa-f]{40})")
+
+_breach_index = None
+
+
+def _read_records(path):
+    """Yield 20-byte records from a run file in large buffered reads."""
+    with open(path, "rb") as run_file:
+        while True:
+            block = run_file.read(_HASH_SIZE * 65536)
+            if not block:
+                return
+            for offset in range(0, len(block), _HASH_SIZE):
+                yield block[offset:offset + _HASH_SIZE]
+
+
+def build_breach_index(source_path, index_path=BREACH_INDEX_FILE):
+    """Convert a Pwned Passwords SHA-1 text dump ("HASH:COUNT" lines) into a sorted binary file.
+
+    The dump is sorted in runs that fit in memory and merged, so it works for
+    files with hundreds of millions of lines. The output holds the raw 20-byte
+    hashes plus a table of where each two-byte prefix starts. Returns the
+    number of hashes written.
+    """
+    import tempfile
+    runs = []
+    temp_dir = tempfile.mkdtemp(prefix="pwned-", dir=os.path.dirname(os.path.abspath(index_path)))
+    try:
+        with open(source_path, "rb") as source:
+            batch = []
+            for line in source:
+                match = _HEX_SHA1.match(line)
+                if match:
+                    batch.append(bytes.fromhex(match.group(1).decode()))
+                if len(batch) == _SORT_RUN_SIZE:
+                    runs.append(_write_run(temp_dir, len(runs), batch))
+                    batch = []
+            if batch or not runs:
+                runs.append(_write_run(temp_dir, len(runs), batch))
+
+        counts = [0] * _PREFIX_COUNT
+        written = 0
+        temp_index = index_path + ".tmp"
+        with open(temp_index, "wb") as out:
+            out.write(b"\0" * _BREACH_HEADER)
+            previous = None
+            for record in heapq.merge(*(_read_records(run) for run in runs)):
+                if record == previous:
+                    continue
+                previous = record
+                out.write(record)
+                counts[(record[0] << 8) | record[1]] += 1
+                written += 1
+
+            # Prefix table: record number where each bucket starts, plus the total at the end
+            starts = [0] * (_PREFIX_COUNT + 1)
+            for prefix in range(_PREFIX_COUNT):
+                starts[prefix + 1] = starts[prefix] + counts[prefix]
+            out.seek(0)
+            out.write(_BREACH_MAGIC)
+            out.write(struct.pack(f"<{_PREFIX_COUNT + 1}Q", *starts))
+        os.replace(temp_index, index_path)
+    finally:
+        for run in runs:
+            os.remove(run)
+        os.rmdir(temp_dir)
+
+    _close_breach_index()
+    return written
+
+
+def _write_run(temp_dir, number, batch):
+    batch.sort()
+    path = os.path.join(temp_dir, f"run{number}.bin")
+    with open(path, "wb") as run_file:
+        run_file.write(b"".join(batch))
+    return path
+
+
+def _open_breach_index(index_path=BREACH_INDEX_FILE):
+    """Memory-map the breach index on first use; None if there is no index."""
+    global _breach_index
+    if _breach_index is None or _breach_index[0] != index_path:
+        if not os.path.exists(index_path):
+            return None
+        with open(index_path, "rb") as index_file:
+            mapped = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if mapped[:len(_BREACH_MAGIC)] != _BREACH_MAGIC:
+            mapped.close()
+            raise ValueError(f"{index_path} is not a breach index file")
+        _breach_index = (index_path, mapped)
+    return _breach_index[1]
+
+
+def _close_breach_index():
+    global _breach_index
+    if _breach_index is not None:
+        _breach_index[1].close()
+        _breach_index = None
+
+
+def _digest_in_index(mapped, digest):
+    """Binary-search one SHA-1 digest inside its prefix bucket."""
+    prefix = (digest[0] << 8) | digest[1]
+    lo, hi = struct.unpack_from("<2Q", mapped, len(_BREACH_MAGIC) + 8 * prefix)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        offset = _BREACH_HEADER + mid * _HASH_SIZE
+        record = mapped[offset:offset + _HASH_SIZE]
+        if record < digest:
+            lo = mid + 1
+        elif record > digest:
+            hi = mid
+        else:
+            return True
+    return False
+
+
+def is_breached(password, index_path=BREACH_INDEX_FILE):
+    """True if the password is in the local Pwned Passwords index (False if there is no index)."""
+    mapped = _open_breach_index(index_path)
+    if mapped is None:
+        return False
+    import hashlib
+    return _digest_in_index(mapped, hashlib.sha1(password.encode()).digest())
+
+
+def breached_flags(passwords, index_path=BREACH_INDEX_FILE):
+    """Batch version of is_breached(): one flag per password.
+
+    Lookups run in hash order so neighbouring lookups hit the same pages.
+    """
+    mapped = _open_breach_index(index_path)
+    if mapped is None:
+        return [False] * len(passwords)
+    import hashlib
+    digests = [hashlib.sha1(password.encode()).digest() for password in passwords]
+    flags = [False] * len(passwords)
+    for i in sorted(range(len(digests)), key=digests.__getitem__):
+        flags[i] = _digest_in_index(mapped, digests[i])
+    return flags
+
+
+def build_breach_index_menu():
+    path = input("Enter the path of the Pwned Passwords SHA-1 file: ").strip().strip('"')
+    if not os.path.exists(path):
+        print("File not found.\n")
+        return
+    print("Building the breach index, this can take a while for the full list...")
+    count = build_breach_index(path)
+    print(f"Breach index ready with {count:,} password hashes.\n")
+
+# ============================================
+# USERNAME SIMILARITY
+# ============================================
+SIMILARITY_THRESHOLD = 0.6  # 60% similarity threshold
+_NON_LETTERS = re.compile(r'[^a-z]')
+
+
+def normalize_letters(text):
+    """Lowercase and keep only a-z, the form both similarity checks compare."""
+    return _NON_LETTERS.sub('', text.lower())
+
+
+@functools.lru_cache(maxsize=256)
+def normalize_username(username):
+    """normalize_letters() for usernames, cached since the same one is checked over and over."""
+    return normalize_letters(username)
+
+
+def _lcs_length(a, b):
+    """Length of the longest common subsequence of a and b.
+
+    Bit-parallel algorithm (Allison-Dix / Hyyro): one big-integer step per
+    character of b instead of a len(a) x len(b) table.
+    """
+    masks = {}
+    for i, ch in enumerate(a):
+        masks[ch] = masks.get(ch, 0) | (1 << i)
+    all_bits = (1 << len(a)) - 1
+    v = all_bits
+    for ch in b:
+        u = v & masks.get(ch, 0)
+        v = ((v + u) | (v - u)) & all_bits
+    return len(a) - bin(v).count("1")
+
+
+def too_similar(username, password):
+    """Same verdict as SequenceMatcher(None, user, pass).ratio() >= 0.6, usually much faster.
+
+    SequenceMatcher can never match more characters than the longest common
+    subsequence, so 2 * LCS / total is an upper bound on its ratio. When even
+    that bound (or the cheaper length bound) is below the threshold the answer
+    is "not similar" without running SequenceMatcher at all; only undecided
+    pairs fall back to the exact ratio.
+    """
+    user_norm = normalize_username(username)
+    # Skip similarity check if username has no letters
+    if not user_norm:
+        return False
+    pass_norm = normalize_letters(password)
+    # A password without letters cannot resemble a name (and "" is a substring of anything)
+    if not pass_norm:
+        return False
+
+    # Direct substring check
+    if user_norm in pass_norm or pass_norm in user_norm:
+        return True
+
+    total = len(user_norm) + len(pass_norm)
+    if 2 * min(len(user_norm), len(pass_norm)) < SIMILARITY_THRESHOLD * total:
+        return False
+    if 2 * _lcs_length(user_norm, pass_norm) < SIMILARITY_THRESHOLD * total:
+        return False
+    from difflib import SequenceMatcher
+    return SequenceMatcher(None, user_norm, pass_norm).ratio() >= SIMILARITY_THRESHOLD
+
+# ============================================
+# CHECKING PASSWORD STRENGTH
+# ============================================
+# A zxcvbn-style estimate: the password is split into the cheapest sequence
+# of guessable pieces (dictionary words, keyboard walks, sequences, repeats,
+# dates), with whatever is left priced as brute force. The estimated bits
+# decide strength instead of character-class rules, so "Password1!" is weak
+# and a long passphrase without symbols is strong.
+#
+# Word ranks live in a sorted file (WORD_INDEX_FILE) that is memory-mapped on
+# first use: MAGIC, word count, a table of where each two-byte prefix starts,
+# word offsets, ranks (all native uint32), then the sorted words. Words are found by narrowing a
+# range of that sorted list one character at a time, like walking a trie.
+# Without the file, a built-in list of very common passwords is used.
+WORD_INDEX_FILE = "strength_words.bin"
+_WORD_MAGIC = b"SPMWORD1"
+_WORD_PREFIXES = 1 << 16
+_WORD_TABLE = len(_WORD_MAGIC) + 4      # Start of the prefix table
+_WORD_OFFSETS = _WORD_TABLE + 4 * (_WORD_PREFIXES + 1)
+WORD_MIN_LENGTH = 3
+WORD_MAX_LENGTH = 32
+STRENGTH_MIN_BITS = 50  # Estimated entropy a password needs to count as strong
+
+COMMON_PASSWORDS = """
+password 123456 12345678 qwerty 123456789 12345 1234 111111 1234567 dragon 123123 baseball abc123
+football monkey letmein 696969 shadow master 666666 qwertyuiop 123321 mustang 1234567890 michael
+654321 superman 1qaz2wsx 7777777 121212 000000 qazwsx 123qwe killer trustno1 jordan jennifer zxcvbnm
+asdfgh hunter buster soccer harley batman andrew tigger sunshine iloveyou 2000 charlie robert thomas
+hockey ranger daniel starwars 112233 george computer michelle jessica pepper 1111 zxcvbn 555555
+11111111 131313 freedom 777777 pass maggie 159753 aaaaaa ginger princess joshua cheese amanda summer
+love ashley nicole chelsea matthew access yankees 987654321 dallas austin thunder taylor matrix
+william corvette hello martin heather secret merlin diamond 1234qwer gfhjkm hammer silver 222222
+88888888 anthony justin test bailey q1w2e3r4t5 patrick internet scooter orange 11111 golfer cookie
+richard samantha bigdog guitar jackson whatever mickey chicken sparky snoopy maverick phoenix camaro
+peanut morgan welcome falcon cowboy ferrari samsung andrea smokey steelers joseph mercedes dakota
+arsenal eagles melissa boomer booboo spider nascar monster tigers yellow xxxxxx 123123123 gateway
+marina diablo bulldog qwer1234 compaq purple banana junior hannah 123654 porsche lakers iceman money
+cowboys 987654 london tennis 999999 ncc1701 coffee scooby 0000 miller boston q1w2e3r4 brandon yamaha
+chester mother forever johnny edward 333333 oliver redsox player nikita knight fender barney
+midnight please brandy chicago badboy slayer rangers charles angel flower bigdaddy rabbit wizard
+jasper enter rachel chris steven winner adidas victoria natasha 1q2w3e4r jasmine winter prince
+marine ghbdtn fishing cocacola casper james 232323 raiders 888888 marlboro gandalf asdfasdf crystal
+87654321 12344321 golden 8675309 panther lauren angela spanky thx1138 angels madison winston shannon
+mike toyota jordan23 canada sophie apples tiger razz 123abc pokemon qazxsw 55555 qwaszx muffin
+johnson murphy cooper jonathan liverpoo david danielle 159357 jackie 1990 123456a 789456 turtle
+abcd1234 scorpion qazwsxedc 101010 butter carlos password1 dennis slipknot qwerty123 booger asdf
+1991 black startrek 12341234 cameron newyork rainbow nathan john 1992 rocket viking redskins
+asdfghjkl 1212 sierra peaches gemini doctor wilson sandra helpme qwertyui victor florida dolphin
+pookie captain tucker blue liverpool theman bandit dolphins maddog packers jaguar lovers nicholas
+united tiffany maxwell zzzzzz nirvana jeremy monica elephant giants hotdog rosebud success debbie
+mountain 444444 xxxxxxxx warrior 1q2w3e4r5t q1w2e3 123456q albert metallic lucky azerty 7777 alex
+bond007 alexis 1111111 samson 5150 willie scorpio bonnie gators benjamin voodoo driver dexter 2112
+jason calvin freddy 212121 creative 12345a sydney rush2112 1989 asdfghjk red123 bubba 4815162342
+passw0rd trouble gunner happy gordon legend jessie stella qwert eminem arthur apple nissan bear
+america 1qazxsw2 nothing parker 4444 rebecca qweqwe garfield 01012011 beavis 69696969 jack asdasd
+december 2222 102030 252525 11223344 magic apollo skippy 315475 kitten golf copper braves shelby
+godzilla beaver fred tomcat august buddy airborne 1993 1988 qqqqqq brooklyn animal platinum phantom
+online xavier darkness blink182 power fish green 789456123 voyager police travis 12qwaszx heaven
+snowball lover abcdef 00000 pakistan 007007 walter blazer cricket sniper donkey willow loveme saturn
+therock redwings bigboy pumpkin trinity williams nintendo digital destiny topgun runner marvin
+guinness chance bubbles testing fire november minecraft asdf1234 lasvegas sergey broncos cartman
+private celtic birdie little cassie babygirl donald beatles 1313 family 12121212 school louise
+gabriel eclipse fluffy 147258369 lol123 explorer beer nelson flyers spencer scott lovely gibson
+doggie cherry andrey snickers buffalo pantera metallica member carter qwertyu peter alexande steve
+bronco paradise goober 5555 samuel montana mexico dreams michigan carolina friends magnum surfer
+maximus genius cool vampire lacrosse asd123 aaaa christin kimberly speedy sharon carmen 111222
+kristina sammy racing ou812 sabrina horses 0987654321 qwerty1 baby stalker enigma 147147 star
+poohbear 147258 simple 12345q marcus brian 1987 qweasdzxc drowssap hahaha caroline barbara dave
+viper drummer action einstein genesis hello1 scotty friend forest 010203 hotrod google vanessa
+spitfire badger maryjane friday alaska 1232323q tester jester jake champion billy 147852 rock hawaii
+badass chevy 420420 walker stephen eagle1 bill 1986 october gregory svetlana pamela 1984 music
+shorty westside stanley diesel courtney 242424 kevin hitman mark 12345qwert reddog frank qwe123
+popcorn patricia aaaaaaaa 1969 teresa mozart buddha anderson paul melanie abcdefg security lucky1
+lizard denise 3333 a12345 123789 ruslan stargate simpsons scarface eagle 123456789a thumper olivia
+naruto 1234554321 general cherokee a123456 vincent 1982 1980 apple123 qweasd iloveu dudley welcome1
+monkey1 admin letmein1 login abc trustno monkey123 dragon1 master1 iloveyou1 sunshine1 princess1
+football1
+"""
+
+
+_word_index = None
+_builtin_word_index = None
+_l33t_table = str.maketrans({"4": "a", "@": "a", "3": "e", "1": "i", "!": "i", "0": "o", "$": "s",
+                             "5": "s", "7": "t", "+": "t", "8": "b", "9": "g", "|": "l"})
+
+
+def _pack_word_index(ranks):
+    """Build the sorted word index from {word: rank} (rank 1 = most common)."""
+    words = sorted(word.encode() for word in ranks)
+    starts = [0] * (_WORD_PREFIXES + 1)
+    for word in words:
+        starts[((word[0] << 8) | word[1]) + 1] += 1
+    for prefix in range(_WORD_PREFIXES):
+        starts[prefix + 1] += starts[prefix]
+    offsets = [0]
+    for word in words:
+        offsets.append(offsets[-1] + len(word))
+    return b"".join([
+        _WORD_MAGIC, struct.pack("=I", len(words)),
+        struct.pack(f"={_WORD_PREFIXES + 1}I", *starts),
+        struct.pack(f"={len(words) + 1}I", *offsets),
+        struct.pack(f"={len(words)}I", *(ranks[word.decode()] for word in words)),
+        *words,
+    ])
+
+
+def _add_words(ranks, words):
+    """Record each word's rank (its position in `words`), keeping the best rank seen."""
+    for rank, word in enumerate(words, 1):
+        word = word.lower()
+        if WORD_MIN_LENGTH <= len(word) <= WORD_MAX_LENGTH and rank < ranks.get(word, rank + 1):
+            ranks[word] = rank
+
+
+def build_word_index(source_paths, index_path=WORD_INDEX_FILE):
+    """Build the strength dictionary from word lists, most common first, one per line.
+
+    Lines may carry a count after the word ("word 1234" or "word,1234"); only
+    the first field is used and the line order gives the rank. The built-in
+    common passwords are always included. Returns the number of words.
+    """
+    ranks = {}
+    _add_words(ranks, COMMON_PASSWORDS.split())
+    for path in source_paths:
+        with open(path, encoding="utf-8", errors="ignore") as source:
+            _add_words(ranks, (fields[0] for fields in (re.split(r"[\s,]+", line.strip()) for line in source)
+                               if fields[0]))
+    temp_path = index_path + ".tmp"
+    with open(temp_path, "wb") as out:
+        out.write(_pack_word_index(ranks))
+    os.replace(temp_path, index_path)
+    _close_word_index()
+    return len(ranks)
+
+
+def _open_word_index(index_path=WORD_INDEX_FILE):
+    """Memory-map the word index on first use, falling back to the built-in list."""
+    global _word_index, _builtin_word_index
+    if _word_index is None or _word_index[0] != index_path:
+        if os.path.exists(index_path):
+            with open(index_path, "rb") as index_file:
+                mapped = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+            if mapped[:len(_WORD_MAGIC)] != _WORD_MAGIC:
+                mapped.close()
+                raise ValueError(f"{index_path} is not a word index file")
+        else:
+            if _builtin_word_index is None:
+                ranks = {}
+                _add_words(ranks, COMMON_PASSWORDS.split())
+                _builtin_word_index = _pack_word_index(ranks)
+            mapped = _builtin_word_index
+        count = struct.unpack_from("=I", mapped, len(_WORD_MAGIC))[0]
+        ranks_at = _WORD_OFFSETS + 4 * (count + 1)
+        view = memoryview(mapped)
+        # (path, buffer, prefix starts, word offsets, ranks, where the words start) as uint32 views
+        _word_index = (index_path, mapped, view[_WORD_TABLE:_WORD_OFFSETS].cast("I"),
+                       view[_WORD_OFFSETS:ranks_at].cast("I"), view[ranks_at:ranks_at + 4 * count].cast("I"),
+                       ranks_at + 4 * count)
+    return _word_index
+
+
+def _close_word_index():
+    global _word_index
+    if _word_index is not None:
+        for view in _word_index[2:5]:
+            view.release()  # mmap cannot close while views exist
+        if isinstance(_word_index[1], mmap.mmap):
+            _word_index[1].close()
+        _word_index = None
+
+
+def _dictionary_matches(text, index):
+    """Yield (start, end, rank) for every dictionary word inside `text` (already lowercase)."""
+    _, mapped, starts, offsets, ranks, words_at = index
+    for i in range(len(text) - WORD_MIN_LENGTH + 1):
+        head = text[i:i + 2].encode()
+        if len(head) < 2:
+            continue
+        bucket = (head[0] << 8) | head[1]
+        lo, hi = starts[bucket], starts[bucket + 1]
+        if lo == hi:
+            continue
+        for end in range(i + WORD_MIN_LENGTH, min(len(text), i + WORD_MAX_LENGTH) + 1):
+            prefix = text[i:end].encode()
+            # Narrow [lo, hi) to the first word >= prefix; words sharing the prefix follow it
+            low, high = lo, hi
+            while low < high:
+                mid = (low + high) // 2
+                if mapped[words_at + offsets[mid]:words_at + offsets[mid + 1]] < prefix:
+                    low = mid + 1
+                else:
+                    high = mid
+            if low == hi:
+                break
+            word = mapped[words_at + offsets[low]:words_at + offsets[low + 1]]
+            if not word.startswith(prefix):
+                break  # No longer word can start here either
+            lo = low
+            if len(word) == len(prefix):
+                yield i, end, ranks[low]
+
+
+def _uppercase_bits(token):
+    """Extra guesses for the capitalisation of a dictionary word."""
+    upper = sum(c.isupper() for c in token)
+    lower = sum(c.islower() for c in token)
+    if upper == 0:
+        return 0.0
+    if lower == 0 or (upper == 1 and (token[0].isupper() or token[-1].isupper())):
+        return 1.0
+    return math.log2(sum(math.comb(upper + lower, k) for k in range(1, min(upper, lower) + 1)))
+
+
+# Keyboard rows, unshifted then shifted. A leading space pads a row so that
+# q sits under 1 and 2, a under q and w, and z under a and s.
+_KEYBOARD_ROWS = ("`1234567890-=", " qwertyuiop[]\\", " asdfghjkl;'", " zxcvbnm,./")
+_SHIFTED_ROWS = ("~!@#$%^&*()_+", " QWERTYUIOP{}|", ' ASDFGHJKL:"', " ZXCVBNM<>?")
+_SHIFTED_CHARS = frozenset("".join(_SHIFTED_ROWS).replace(" ", ""))
+_KEYBOARD_DEGREE = 4.6  # Average number of neighbours of a key
+_keyboard_steps = None
+
+
+def _keyboard_step(pair):
+    """Which neighbour (0-5) of the first key in `pair` the second key is, or None if they are not adjacent."""
+    global _keyboard_steps
+    if _keyboard_steps is None:
+        positions = {}
+        for rows in (_KEYBOARD_ROWS, _SHIFTED_ROWS):
+            for row, keys in enumerate(rows):
+                for column, key in enumerate(keys):
+                    if key != " ":
+                        positions[key] = (row, column)
+        # Each row sits half a key to the right of the one above it
+        neighbours = ((0, -1), (0, 1), (-1, 0), (-1, 1), (1, -1), (1, 0))
+        _keyboard_steps = {}
+        for first, (row, column) in positions.items():
+            for second, (other_row, other_column) in positions.items():
+                step = (other_row - row, other_column - column)
+                if step in neighbours:
+                    _keyboard_steps[first + second] = neighbours.index(step)
+    return _keyboard_steps.get(pair)
+
+
+def _keyboard_bits(length, turns, shifted):
+    keys = sum(len(row.strip()) for row in _KEYBOARD_ROWS)
+    guesses = 0
+    for i in range(2, length + 1):
+        for j in range(1, min(turns, i - 1) + 1):
+            guesses += math.comb(i - 1, j - 1) * keys * _KEYBOARD_DEGREE ** j
+    return math.log2(guesses) + (1 if shifted else 0)
+
+
+def _keyboard_matches(password):
+    """Yield (start, end, bits) for runs of 3+ adjacent keys, like 'qwerty' or 'zxcvbn'."""
+    i = 0
+    while i < len(password) - 2:
+        j, turns, steps = i + 1, 0, [None, None]
+        while j < len(password):
+            step = _keyboard_step(password[j - 1:j + 1])
+            if step is None:
+                break
+            # A zigzag like '1q2w3e' alternates two directions; only its first two steps are turns
+            if step != steps[-1] and not (step == steps[-2] and turns >= 2):
+                turns += 1
+            steps.append(step)
+            j += 1
+        if j - i >= 3:
+            shifted = any(c in _SHIFTED_CHARS for c in password[i:j])
+            yield i, j, _keyboard_bits(j - i, turns, shifted)
+            i = j
+        else:
+            i += 1
+
+
+def _sequence_matches(password):
+    """Yield (start, end, bits) for runs like 'abcd', '1357' or 'zyx'."""
+    i = 0
+    while i < len(password) - 2:
+        delta = ord(password[i + 1]) - ord(password[i])
+        j = i + 1
+        while (j < len(password) and 0 < abs(delta) <= 5 and ord(password[j]) - ord(password[j - 1]) == delta
+               and password[j].isalnum() and password[j].isdigit() == password[i].isdigit()):
+            j += 1
+        if j - i >= 3 and password[i].isalnum():
+            first = password[i]
+            if first in "aAzZ019":
+                base = 2.0
+            elif first.isdigit():
+                base = math.log2(10)
+            else:
+                base = math.log2(26) + (1 if first.isupper() else 0)
+            yield i, j, base + math.log2(j - i) + (1 if delta < 0 else 0)
+            i = j
+        else:
+            i += 1
+
+
+_REPEAT = re.compile(r"(.+?)\1+")
+_DATE_WITH_SEPARATOR = re.compile(r"(?<!\d)(\d{1,4})([\s/\\_.-])(\d{1,2})\2(\d{1,4})(?!\d)")
+_DIGIT_RUN = re.compile(r"\d{4,8}")
+REFERENCE_YEAR = time.localtime().tm_year
+_MAX_DATE_YEAR = REFERENCE_YEAR + 25
+_MIN_YEAR_SPACE = 20
+
+
+def _valid_date(day, month, year):
+    if year < 100:
+        year += 2000 if year <= REFERENCE_YEAR % 100 else 1900
+    return 1 <= day <= 31 and 1 <= month <= 12 and 1900 <= year <= _MAX_DATE_YEAR, year
+
+
+def _date_bits(year, separator):
+    return math.log2(365 * max(abs(year - REFERENCE_YEAR), _MIN_YEAR_SPACE)) + (2 if separator else 0)
+
+
+def _date_matches(password):
+    """Yield (start, end, bits) for years and dates like 1987, 24/12/1990 or 19900412."""
+    for match in _DATE_WITH_SEPARATOR.finditer(password):
+        first, middle, last = int(match.group(1)), int(match.group(3)), int(match.group(4))
+        for day, month, year in ((first, middle, last), (middle, first, last), (last, middle, first)):
+            valid, year = _valid_date(day, month, year)
+            if valid:
+                yield match.start(), match.end(), _date_bits(year, True)
+                break
+    for match in _DIGIT_RUN.finditer(password):
+        digits = match.group()
+        for i in range(len(digits) - 3):
+            year = int(digits[i:i + 4])
+            if 1900 <= year <= _MAX_DATE_YEAR:
+                yield match.start() + i, match.start() + i + 4, math.log2(max(abs(year - REFERENCE_YEAR), _MIN_YEAR_SPACE))
+        if len(digits) in (6, 8):
+            width = len(digits) - 4
+            # ddmmyy(yy), mmddyy(yy) and yy(yy)mmdd
+            for day, month, year in ((digits[:2], digits[2:4], digits[4:]), (digits[2:4], digits[:2], digits[4:]),
+                                     (digits[-2:], digits[-4:-2], digits[:width])):
+                valid, year = _valid_date(int(day), int(month), int(year))
+                if valid:
+                    yield match.start(), match.end(), _date_bits(year, False)
+                    break
+
+
+def _cardinality(password):
+    """Size of the character set a brute-force attacker would need for this password."""
+    size = 0
+    if any(c.islower() for c in password):
+        size += 26
+    if any(c.isupper() for c in password):
+        size += 26
+    if any(c.isdigit() for c in password):
+        size += 10
+    if any(not c.isalnum() and c.isascii() for c in password):
+        size += 33
+    if any(not c.isascii() for c in password):
+        size += 100
+    return size or 1
+
+
+def estimate_strength(password, username=""):
+    """Estimate how guessable a password is.
+
+    Returns a dict with "bits" (log2 of the estimated guesses) and "feedback",
+    a list of the patterns that made it weaker. Feedback names the kind of
+    pattern only, never characters of the password, because it ends up in
+    audit reports and command output.
+    """
+    n = len(password)
+    if n == 0:
+        return {"bits": 0.0, "feedback": ["Enter a password"]}
+    lowered = password.lower()
+    index = _open_word_index()
+    matches = []  # (start, end, bits, feedback)
+
+    for start, end, rank in _dictionary_matches(lowered, index):
+        token = password[start:end]
+        note = "This is one of the most common passwords" if rank <= 10 and end - start == n else \
+            "Contains a common word or password"
+        if token[0].isupper() and token[1:].islower():
+            note += "; capitalising the first letter does not help much"
+        matches.append((start, end, math.log2(rank) + _uppercase_bits(token), note))
+    unleeted = lowered.translate(_l33t_table)
+    if unleeted != lowered:
+        for start, end, rank in _dictionary_matches(unleeted, index):
+            substituted = sum(a != b for a, b in zip(lowered[start:end], unleeted[start:end]))
+            if substituted:
+                matches.append((start, end, math.log2(rank) + _uppercase_bits(password[start:end]) + substituted,
+                                "Predictable substitutions like '@' for 'a' do not help much"))
+    user_norm = username.lower()
+    if len(user_norm) >= WORD_MIN_LENGTH:
+        start = lowered.find(user_norm)
+        while start != -1:
+            matches.append((start, start + len(user_norm), 1.0, "Do not use your username in the password"))
+            start = lowered.find(user_norm, start + 1)
+    for start, end, bits in _keyboard_matches(password):
+        matches.append((start, end, bits, "Keyboard patterns like 'qwerty' are easy to guess"))
+    for start, end, bits in _sequence_matches(password):
+        matches.append((start, end, bits, "Sequences like 'abc' or '1234' are easy to guess"))
+    for match in _REPEAT.finditer(password):
+        block = match.group(1)
+        count = len(match.group()) // len(block)
+        block_bits = estimate_strength(block)["bits"] if len(block) > 1 else math.log2(_cardinality(block))
+        matches.append((match.start(), match.end(), block_bits + math.log2(count),
+                        "Repeated characters or blocks like 'aaa' or 'abcabc' are easy to guess"))
+    for start, end, bits in _date_matches(password):
+        matches.append((start, end, bits, "Dates and years are easy to guess"))
+
+    # Cheapest way to spell out the password: best[i] covers password[:i]
+    by_end = {}
+    for match in matches:
+        by_end.setdefault(match[1], []).append(match)
+    char_bits = math.log2(_cardinality(password))
+    best = [0.0] * (n + 1)
+    used = [None] * (n + 1)
+    for i in range(1, n + 1):
+        best[i], used[i] = best[i - 1] + char_bits, None
+        for match in by_end.get(i, ()):
+            if best[match[0]] + match[2] < best[i]:
+                best[i], used[i] = best[match[0]] + match[2], match
+
+    feedback = []
+    i = n
+    while i > 0:
+        if used[i] is None:
+            i -= 1
+        else:
+            if used[i][3] not in feedback:
+                feedback.insert(0, used[i][3])
+            i = used[i][0]
+    return {"bits": round(best[n], 1), "feedback": feedback}
+
+
+def check_password_strength(password, username="", breached=None):
+    """Check if a password is strong and return feedback.
+
+    Pass `breached` when the breach lookup was already done, e.g. for a whole batch.
+    """
+    estimate = estimate_strength(password, username)
+    feedback_parts = []
+
+    # --- Known data breaches (only when a local breach index exists) ---
+    if is_breached(password) if breached is None else breached:
+        feedback_parts.append("Password appears in a known data breach")
+
+    # --- Similarity check with username ---
+    if username and too_similar(username, password):
+        feedback_parts.append("Password is too similar to username")
+
+    # --- Guessability ---
+    if estimate["bits"] < STRENGTH_MIN_BITS:
+        feedback_parts.extend(estimate["feedback"] or ["Add more words or characters; length beats complexity"])
+
+    # --- Final result ---
+    if not feedback_parts:
+        return True, f"Strong password (about {estimate['bits']:.0f} bits) "
+    else:
+        return False, f"Weak password (about {estimate['bits']:.0f} bits) - Issue: " + ", ".join(feedback_parts)
+
+# ============================================
+# GENERATE A STRONG PASSWORD
+# ============================================
+SPECIAL_CHARS = "!@#$%^&*()-_=+[]{};:,.<>?"
+STRENGTH_SPECIALS = "!@#$%^&*(),.?\":{}|<>"  # Specials that sites with character-class rules accept
+DEFAULT_PASSWORD_LENGTH = 16
+
+
+def _unused_letter_pair(user_norm):
+    """Pick two letters whose pairing never appears in the normalised username."""
+    pairs = {user_norm[i:i + 2] for i in range(len(user_norm) - 1)}
+    for first in string.ascii_lowercase:
+        for second in string.ascii_lowercase:
+            if first + second not in pairs and second + first not in pairs:
+                return first, second
+    raise ValueError("Cannot generate a password that is dissimilar to this username")
+
+
+def _password_pools(username="", lowercase=True, uppercase=True, digits=True, special_chars=SPECIAL_CHARS):
+    """Work out (required_pools, filler_chars) for generated passwords.
+
+    Each required pool contributes one character, which guarantees every
+    enabled character class is present. Letters that appear in the username
+    are left out entirely, so the password's letters share nothing with the
+    username and can never look similar to it.
+    """
+    user_letters = set(normalize_username(username))
+    lower = "".join(c for c in string.ascii_lowercase if c not in user_letters)
+    upper = lower.upper()
+    letters = (lower if lowercase else "") + (upper if uppercase else "")
+
+    required = []
+    if (lowercase or uppercase) and not letters:
+        # The username uses every letter: keep exactly one letter per case and
+        # choose them so the pair does not occur in the username either.
+        first, second = _unused_letter_pair(normalize_username(username))
+        if lowercase:
+            required.append(first)
+        if uppercase:
+            required.append(second.upper())
+    else:
+        if lowercase:
+            required.append(lower)
+        if uppercase:
+            required.append(upper)
+    if digits:
+        required.append(string.digits)
+    if special_chars:
+        # Make sure at least one special is one that class-based rules recognise
+        accepted = "".join(c for c in special_chars if c in STRENGTH_SPECIALS)
+        required.append(accepted or special_chars)
+
+    filler = letters + (string.digits if digits else "") + special_chars
+    if not filler:
+        raise ValueError("At least one character set must be enabled")
+    return required, filler
+
+
+def _build_password(required, filler, length, space, randbelow):
+    """Turn a single CSPRNG draw into one password.
+
+    The draw is read as a mixed-radix number: one digit per required pool,
+    one per filler character, then the Fisher-Yates shuffle swaps. That is
+    exactly uniform and costs one call into the OS random source.
+    """
+    value = randbelow(space)
+    chars = []
+    for pool in required:
+        value, index = divmod(value, len(pool))
+        chars.append(pool[index])
+    for _ in range(length - len(required)):
+        value, index = divmod(value, len(filler))
+        chars.append(filler[index])
+    for i in range(length - 1, 0, -1):
+        value, j = divmod(value, i + 1)
+        chars[i], chars[j] = chars[j], chars[i]
+    return "".join(chars)
+
+
+def generate_passwords(count, username="", length=DEFAULT_PASSWORD_LENGTH, lowercase=True,
+                       uppercase=True, digits=True, special_chars=SPECIAL_CHARS):
+    """Generate `count` strong passwords in one call.
+
+    Every password contains each enabled character class and is never too
+    similar to the username, by construction rather than by retrying.
+    """
+    # SystemRandom draws from os.urandom like the secrets module, without its hashlib/hmac imports
+    from random import SystemRandom
+    randbelow = SystemRandom().randrange
+    required, filler = _password_pools(username, lowercase, uppercase, digits, special_chars)
+    if length < len(required):
+        raise ValueError(f"Password length must be at least {len(required)}")
+    space = math.prod(len(pool) for pool in required) * len(filler) ** (length - len(required)) * math.factorial(length)
+    if _profile_stats is not None:
+        profile_count("generate_passwords.attempts", count)  # One draw per password, never retried
+    return [_build_password(required, filler, length, space, randbelow) for _ in range(count)]
+
+
+def generate_password(username="", length=DEFAULT_PASSWORD_LENGTH, **options):
+    """Generate a strong password that meets all criteria and isn't too similar to the username."""
+    return generate_passwords(1, username, length, **options)[0]
+
+# ============================================
+# DATABASE CONNECTION
+# ============================================
+DB_FILE = "password_manager.db"
+BUSY_TIMEOUT = 5.0   # Seconds SQLite waits for another process's write lock
+BUSY_RETRIES = 4     # Further attempts, with backoff, if a write still finds the vault locked
+
+_connection = None
+_connection_pid = None
+
+
+def _open_connection():
+    """Open a SQLite connection to the vault with WAL journaling and tuned pragmas."""
+    import sqlite3
+    # cached_statements keeps the prepared statements for our fixed SQL strings around
+    factory = _profiled_connection_class() if _profile_stats is not None else sqlite3.Connection
+    conn = sqlite3.connect(DB_FILE, timeout=BUSY_TIMEOUT, cached_statements=256, check_same_thread=False,
+                           factory=factory)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")  # Safe with WAL, avoids an fsync per commit
+    conn.execute("PRAGMA cache_size = -8000")    # ~8 MB page cache
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+def get_connection():
+    """Return the long-lived connection for this process, opening it on first use."""
+    global _connection, _connection_pid
+    # A connection must never be shared with a forked child process. The
+    # parent's copy is left alone rather than closed, since closing it here
+    # would drop the parent's file locks on the vault.
+    if _connection is None or _connection_pid != os.getpid():
+        _connection = _open_connection()
+        _connection_pid = os.getpid()
+    return _connection
+
+
+def close_connections():
+    """Close this process's shared connection."""
+    global _connection, _connection_pid
+    if _connection is not None and _connection_pid == os.getpid():
+        _connection.close()
+    _connection = None
+    _connection_pid = None
+
+
+atexit.register(close_connections)
+
+
+def retry_when_busy(function):
+    """Retry a write that failed because another process held the lock, backing off between attempts.
+
+    The failed transaction has already been rolled back by `with conn:`, so
+    running the function again is safe.
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        import random
+        import sqlite3
+        delay = 0.05
+        for attempt in range(BUSY_RETRIES + 1):
+            try:
+                return function(*args, **kwargs)
+            except sqlite3.OperationalError as error:
+                if attempt == BUSY_RETRIES or not ("locked" in str(error) or "busy" in str(error)):
+                    raise
+            time.sleep(delay * random.uniform(0.5, 1.5))  # Jitter so competing writers spread out
+            delay *= 2
+    return wrapper
+
+# ============================================
+# SCHEMA MIGRATIONS
+# ============================================
+MIGRATION_BATCH_SIZE = 10000  # Rows copied per step when a table is rebuilt
+
+
+def _migration_base_schema(conn):
+    """Version 1: the original tables (already present in older databases)."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS credentials (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            website TEXT NOT NULL,
+            username TEXT NOT NULL,
+            password TEXT NOT NULL
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS master (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            password TEXT NOT NULL
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS key_rotation (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            last_id INTEGER NOT NULL
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS import_progress (
+            source TEXT PRIMARY KEY,
+            file_size INTEGER NOT NULL,
+            rows_done INTEGER NOT NULL
+        )
+    ''')
+
+
+def _migration_search_index(conn):
+    """Version 2: website/username index and the full-text search table."""
+    # Website lookups use the leftmost column of this index, so no separate
+    # single-column index is needed. NOCASE lets LIKE 'abc%' use it.
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_credentials_website_username
+        ON credentials (website COLLATE NOCASE, username COLLATE NOCASE)
+    ''')
+    create_search_index(conn)
+
+
+def _migration_timestamps(conn):
+    """Version 3: rebuild credentials with created_at/updated_at and a BLOB password column."""
+    conn.execute('''
+        CREATE TABLE credentials_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            website TEXT NOT NULL,
+            username TEXT NOT NULL,
+            password BLOB NOT NULL,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    _copy_in_batches(conn, "credentials", "credentials_new", "id, website, username, password")
+
+    sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'credentials'").fetchone()
+    conn.execute("DROP TABLE credentials")  # Also drops its triggers and indexes
+    conn.execute("ALTER TABLE credentials_new RENAME TO credentials")
+    if sequence:
+        # Keep AUTOINCREMENT from handing out IDs of credentials deleted earlier
+        conn.execute("UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = 'credentials'", (sequence[0],))
+    _migration_search_index(conn)
+
+
+def _copy_in_batches(conn, source, target, columns):
+    """Copy every row of `source` into `target` in ID-ordered batches, printing progress."""
+    total = conn.execute(f"SELECT COUNT(*) FROM {source}").fetchone()[0]
+    done = 0
+    last_id = 0
+    while True:
+        # Upper ID of the next batch, so each step is a cheap range copy on the primary key
+        bound = conn.execute(
+            f"SELECT max(id) FROM (SELECT id FROM {source} WHERE id > ? ORDER BY id LIMIT ?)",
+            (last_id, MIGRATION_BATCH_SIZE)
+        ).fetchone()[0]
+        if bound is None:
+            break
+        cursor = conn.execute(
+            f"INSERT INTO {target} ({columns}) SELECT {columns} FROM {source} WHERE id > ? AND id <= ?",
+            (last_id, bound)
+        )
+        done += cursor.rowcount
+        last_id = bound
+        print(f"\rRebuilding {source}: {done:,}/{total:,} rows", end="", flush=True)
+    if total:
+        print()
+
+
+def _migration_settings(conn):
+    """Version 4: key/value settings stored with the vault (e.g. the record format)."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS settings (
+            name TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    ''')
+
+
+def _migration_master_kdf(conn):
+    """Version 5: scrypt parameters and the wrapped vault key for the master password."""
+    for column in ("kdf_salt BLOB", "kdf_n INTEGER", "kdf_r INTEGER", "kdf_p INTEGER", "wrapped_key BLOB"):
+        conn.execute(f"ALTER TABLE master ADD COLUMN {column}")
+
+
+def _migration_versions(conn):
+    """Version 6: a per-row version number so concurrent edits can be detected."""
+    conn.execute("ALTER TABLE credentials ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+
+def _migration_change_tracking(conn):
+    """Version 7: a change counter for edited rows plus tombstones for deletes, used by incremental backups."""
+    conn.execute("ALTER TABLE credentials ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_credentials_change_seq ON credentials (change_seq)")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS change_counter (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            value INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("INSERT OR IGNORE INTO change_counter (id, value) VALUES (1, 0)")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tombstones (
+            id INTEGER PRIMARY KEY,
+            change_seq INTEGER NOT NULL
+        )
+    ''')
+    # Edits (which bump version) take the next counter value. New rows need no
+    # trigger: AUTOINCREMENT IDs only grow, so a backup remembers the highest ID
+    # it saw. Key rotation and format conversion only rewrite ciphertext and do
+    # not count as changes.
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS credentials_change_update AFTER UPDATE OF version ON credentials BEGIN
+            UPDATE change_counter SET value = value + 1 WHERE id = 1;
+            UPDATE credentials SET change_seq = (SELECT value FROM change_counter WHERE id = 1)
+            WHERE id = new.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS credentials_change_delete AFTER DELETE ON credentials BEGIN
+            UPDATE change_counter SET value = value + 1 WHERE id = 1;
+            INSERT OR REPLACE INTO tombstones (id, change_seq)
+            VALUES (old.id, (SELECT value FROM change_counter WHERE id = 1));
+        END
+    ''')
+
+
+
+def _migration_totp(conn):
+    """Version 8: the authenticator app (TOTP) secret, encrypted with the vault key."""
+    conn.execute("ALTER TABLE master ADD COLUMN totp_secret BLOB")
+
+
+def _migration_kdf_hash(conn):
+    """Version 9: the scrypt hash that verifies the master password, replacing the wrapped key."""
+    conn.execute("ALTER TABLE master ADD COLUMN kdf_hash BLOB")
+
+
+# Each entry upgrades the schema by one version; never reorder or edit shipped ones
+MIGRATIONS = [
+    _migration_base_schema,
+    _migration_search_index,
+    _migration_timestamps,
+    _migration_settings,
+    _migration_master_kdf,
+    _migration_versions,
+    _migration_change_tracking,
+    _migration_totp,
+    _migration_kdf_hash,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate_db(conn):
+    """Bring the database schema up to SCHEMA_VERSION, tracked in PRAGMA user_version.
+
+    An up-to-date database costs a single pragma read. Otherwise every pending
+    migration runs in its own transaction together with the version bump, so
+    an interrupted upgrade never leaves a half-migrated schema behind. The
+    version is read again once the write lock is held, so when two programs
+    upgrade the same file at once each migration runs only once.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+    upgrading = version > 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                conn.rollback()
+                return
+            number = version + 1
+            if upgrading:
+                print(f"Upgrading database to version {number}...")
+            MIGRATIONS[number - 1](conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+# ============================================
+# DATABASE SETUP
+# ============================================
+def init_db():
+    conn = get_connection()
+    migrate_db(conn)
+
+    master = conn.execute("SELECT password, kdf_hash, wrapped_key FROM master WHERE id = 1").fetchone()
+    if not master:
+        set_master_password("1")  # Default password for first run
+        print("Default master password created. (Use '1' to log in first time.)")
+    elif master[1] is None and master[2] is None:
+        # Vaults from before the key-derivation upgrade stored the master password encrypted
+        print("Upgrading master password protection (one-time)...")
+        set_master_password(decrypt_password(master[0]))
+
+
+def get_setting(name, default=None):
+    row = get_connection().execute("SELECT value FROM settings WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else default
+
+
+@retry_when_busy
+def set_setting(name, value):
+    conn = get_connection()
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO settings (name, value) VALUES (?, ?)", (name, value))
+
+
+# ============================================
+# MASTER PASSWORD
+# ============================================
+# The master password is never stored, only a verifier: its scrypt hash, with
+# the cost calibrated on this machine. The vault itself is encrypted with
+# key.key, which the email reset and the scripted tools need without a
+# password, so the master password gates the program but does not protect a
+# copied folder (see "What the master password protects" in the README).
+KDF_TARGET_SECONDS = 0.25  # Roughly how long one unlock should take
+KDF_MIN_N = 2 ** 14
+KDF_MAX_N = 2 ** 18        # 256 MiB of memory with r = 8
+KDF_R = 8
+KDF_P = 1
+_WRAP_CONTEXT = b"spm vault key"  # Vaults from schema 5 to 8 kept a wrapped key instead of kdf_hash
+
+
+def _hash_master_password(password, salt, n, r, p):
+    import hashlib
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r * p, dklen=32)
+
+
+def calibrate_kdf(target_seconds=KDF_TARGET_SECONDS):
+    """Pick the scrypt cost that takes about target_seconds here. Returns (n, r, p, seconds)."""
+    n = KDF_MIN_N
+    while True:
+        start = time.perf_counter()
+        _hash_master_password("calibration", bytes(16), n, KDF_R, KDF_P)
+        elapsed = time.perf_counter() - start
+        # Doubling n doubles the time, so stop at the power of two closest to the target
+        if elapsed * 1.41 >= target_seconds or n >= KDF_MAX_N:
+            return n, KDF_R, KDF_P, elapsed
+        n *= 2
+
+
+def _unwrap_vault_key(password_hash, wrapped):
+    """Return the vault key from an old wrapped copy, or None if the password behind the hash is wrong."""
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    try:
+        return AESGCM(password_hash).decrypt(wrapped[:12], wrapped[12:], _WRAP_CONTEXT)
+    except InvalidTag:
+        return None
+
+
+def set_master_password(new_password, kdf_params=None):
+    """Store the scrypt hash of a new master password, calibrating the KDF unless params are given."""
+    n, r, p = kdf_params or calibrate_kdf()[:3]
+    salt = os.urandom(16)
+    conn = get_connection()
+    with conn:
+        conn.execute('''
+            INSERT INTO master (id, password, kdf_salt, kdf_n, kdf_r, kdf_p, kdf_hash, wrapped_key)
+            VALUES (1, '', ?, ?, ?, ?, ?, NULL)
+            ON CONFLICT (id) DO UPDATE SET
+                password = '', kdf_salt = excluded.kdf_salt, kdf_n = excluded.kdf_n, kdf_r = excluded.kdf_r,
+                kdf_p = excluded.kdf_p, kdf_hash = excluded.kdf_hash, wrapped_key = NULL
+        ''', (salt, n, r, p, _hash_master_password(new_password, salt, n, r, p)))
+
+
+def verify_master_password(password):
+    """Check the master password against its stored scrypt hash."""
+    import hmac
+    if password is None:
+        return False
+    conn = get_connection()
+    row = conn.execute("SELECT kdf_salt, kdf_n, kdf_r, kdf_p, kdf_hash, wrapped_key FROM master WHERE id = 1").fetchone()
+    if not row or row[4] is None and row[5] is None:
+        return False
+    derived = _hash_master_password(password, *row[:4])
+    if row[4] is not None:
+        return hmac.compare_digest(derived, row[4])
+    if _unwrap_vault_key(derived, row[5]) is None:
+        return False
+    # A vault from before kdf_hash: keep the same salt and cost, store the hash, drop the wrapped key
+    with conn:
+        conn.execute("UPDATE master SET kdf_hash = ?, wrapped_key = NULL WHERE id = 1", (derived,))
+    return True
+
+
+def kdf_parameters():
+    """The scrypt parameters currently protecting the master password, as (n, r, p)."""
+    return get_connection().execute("SELECT kdf_n, kdf_r, kdf_p FROM master WHERE id = 1").fetchone()
+
+
+def load_totp_secret():
+    """The authenticator secret, or None when no app is set up."""
+    row = get_connection().execute("SELECT totp_secret FROM master WHERE id = 1").fetchone()
+    if not row or row[0] is None:
+        return None
+    return decrypt_password(row[0]).encode("latin-1")
+
+
+@retry_when_busy
+def set_totp_secret(secret):
+    """Store (or with None, remove) the authenticator secret, encrypted with the vault key."""
+    token = None if secret is None else encrypt_password(secret.decode("latin-1"))
+    conn = get_connection()
+    with conn:
+        conn.execute("UPDATE master SET totp_secret = ? WHERE id = 1", (token,))
+
+
+# ============================================
+# LISTING CREDENTIALS
+# ============================================
+PAGE_SIZE = 20     # Rows printed before asking to continue
+FETCH_CHUNK = 500  # Rows pulled from SQLite per query
+
+def _like_pattern(text):
+    """Build a case-insensitive substring pattern for LIKE, escaping wildcards."""
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+def _credential_filters(website=None, username=None):
+    """Return the extra WHERE clauses and parameters for the website/username filters."""
+    clauses, params = [], []
+    if website:
+        clauses.append("website LIKE ? ESCAPE '\\'")
+        params.append(_like_pattern(website))
+    if username:
+        clauses.append("username LIKE ? ESCAPE '\\'")
+        params.append(_like_pattern(username))
+    return clauses, params
+
+def iter_credentials(website=None, username=None, offset=0, limit=None, chunk_size=FETCH_CHUNK):
+    """Yield (id, website, username, encrypted_password) rows in ID order.
+
+    Rows are fetched chunk by chunk using the last seen ID, so memory stays flat
+    no matter how big the vault is. Passwords stay encrypted; call
+    decrypt_password() only for the rows you actually show.
+    """
+    clauses, params = _credential_filters(website, username)
+    where = " AND ".join(["id > ?"] + clauses)
+    sql = f"SELECT id, website, username, password FROM credentials WHERE {where} ORDER BY id LIMIT ? OFFSET ?"
+
+    conn = get_connection()
+    last_id = 0
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        rows = conn.execute(sql, (last_id, *params, size, offset)).fetchall()
+        if not rows:
+            return
+        offset = 0  # The offset only applies to the first chunk
+        yield from rows
+        last_id = rows[-1][0]
+        if remaining is not None:
+            remaining -= len(rows)
+        if len(rows) < size:
+            return
+
+def list_credentials(page=1, page_size=PAGE_SIZE, website=None, username=None):
+    """Return one page (1-based) of matching credentials."""
+    return list(iter_credentials(website=website, username=username,
+                                 offset=(page - 1) * page_size, limit=page_size))
+
+def count_credentials(website=None, username=None):
+    """Count the credentials matching the filters."""
+    clauses, params = _credential_filters(website, username)
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    return get_connection().execute(f"SELECT COUNT(*) FROM credentials{where}", params).fetchone()[0]
+
+def get_credential(credential_id):
+    """Fetch a single (id, website, username, encrypted_password, version) row, or None."""
+    return get_connection().execute(
+        "SELECT id, website, username, password, version FROM credentials WHERE id = ?", (credential_id,)
+    ).fetchone()
+
+
+# ============================================
+# SEARCH
+# ============================================
+SEARCH_LIMIT = 20
+SEARCH_CANDIDATES = 200   # Rows pulled from the full-text index before re-ranking
+
+_fts_available = None
+
+
+def create_search_index(conn):
+    """Create the trigram full-text index over website/username and the triggers that keep it in sync."""
+    import sqlite3
+    global _fts_available
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'credentials_fts'"
+    ).fetchone()
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS credentials_fts USING fts5(
+                website, username, content='credentials', content_rowid='id', tokenize='trigram'
+            )
+        ''')
+    except sqlite3.OperationalError:
+        # SQLite older than 3.34 or built without FTS5: search falls back to LIKE
+        _fts_available = False
+        return
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS credentials_fts_insert AFTER INSERT ON credentials BEGIN
+            INSERT INTO credentials_fts (rowid, website, username) VALUES (new.id, new.website, new.username);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS credentials_fts_delete AFTER DELETE ON credentials BEGIN
+            INSERT INTO credentials_fts (credentials_fts, rowid, website, username)
+            VALUES ('delete', old.id, old.website, old.username);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS credentials_fts_update AFTER UPDATE OF website, username ON credentials BEGIN
+            INSERT INTO credentials_fts (credentials_fts, rowid, website, username)
+            VALUES ('delete', old.id, old.website, old.username);
+            INSERT INTO credentials_fts (rowid, website, username) VALUES (new.id, new.website, new.username);
+        END
+    ''')
+    if not exists:
+        # Index whatever is already in the vault
+        conn.execute("INSERT INTO credentials_fts (credentials_fts) VALUES ('rebuild')")
+    _fts_available = True
+
+
+def _trigrams(text):
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _fts_phrase(text):
+    """Quote text as a single FTS5 phrase."""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _search_score(query, website, username):
+    """Rank a candidate: substring and prefix matches first, then trigram overlap."""
+    query = query.lower()
+    best = 0.0
+    query_grams = _trigrams(query)
+    for field in (website.lower(), username.lower()):
+        if field.startswith(query):
+            score = 3.0
+        elif query in field:
+            score = 2.0
+        else:
+            grams = _trigrams(field)
+            score = len(query_grams & grams) / len(query_grams | grams) if grams else 0.0
+        best = max(best, score)
+    return best
+
+
+def _fts_matches(conn, text):
+    """IDs of rows whose website or username contains `text` (at least 3 characters)."""
+    # No ORDER BY rank: ranking would score every match, we re-rank the few we keep
+    return [row[0] for row in conn.execute(
+        "SELECT rowid FROM credentials_fts WHERE credentials_fts MATCH ? LIMIT ?",
+        (_fts_phrase(text), SEARCH_CANDIDATES)
+    )]
+
+
+def _prefix_matches(conn, text):
+    """IDs of rows whose website starts with `text`, straight from the website index."""
+    return [row[0] for row in conn.execute(
+        "SELECT id FROM credentials WHERE website LIKE ? ESCAPE '\\' ORDER BY website COLLATE NOCASE LIMIT ?",
+        (_like_pattern(text)[1:], SEARCH_CANDIDATES)
+    )]
+
+
+def search_credentials(query, limit=SEARCH_LIMIT):
+    """Find credentials whose website or username matches `query`, best matches first.
+
+    Candidates come from the website index (prefix matches) and the trigram
+    full-text index, so it stays fast on very large vaults, and are then
+    re-ranked: prefix matches first, then other substring matches, then by
+    trigram overlap for typo-tolerant results.
+    Returns (id, website, username, encrypted_password) rows;
+    nothing is decrypted here.
+    """
+    global _fts_available
+    query = query.strip()
+    if not query:
+        return []
+    conn = get_connection()
+
+    if len(query) < 3:
+        # Too short for trigrams: website prefix search through the index
+        return conn.execute(
+            "SELECT id, website, username, password FROM credentials WHERE website LIKE ? ESCAPE '\\' "
+            "ORDER BY website COLLATE NOCASE LIMIT ?",
+            (_like_pattern(query)[1:], limit)
+        ).fetchall()
+    if _fts_available is None:
+        _fts_available = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'credentials_fts'"
+        ).fetchone() is not None
+    # The substring lookups below stop at SEARCH_CANDIDATES unranked rows, so
+    # prefix matches, which always rank highest, are fetched separately
+    prefixed = _prefix_matches(conn, query)
+    if not _fts_available:
+        candidates = prefixed + [row[0] for row in conn.execute(
+            "SELECT id FROM credentials WHERE website LIKE ? ESCAPE '\\' OR username LIKE ? ESCAPE '\\' LIMIT ?",
+            (_like_pattern(query), _like_pattern(query), SEARCH_CANDIDATES)
+        )]
+    else:
+        candidates = prefixed + _fts_matches(conn, query)
+    if not candidates and _fts_available:
+        # Probably a typo. A single wrong character leaves either the first or
+        # the second half of the query intact, so look for rows holding either
+        # half and let the re-ranking sort out the closest ones.
+        half = max(3, len(query) // 2)
+        for piece in dict.fromkeys((query[:half], query[-half:])):
+            candidates += _fts_matches(conn, piece)
+
+    if not candidates:
+        return []
+    candidates = list(dict.fromkeys(candidates))
+    rows = conn.execute(
+        f"SELECT id, website, username, password FROM credentials WHERE id IN ({','.join('?' * len(candidates))})",
+        candidates
+    ).fetchall()
+    rows.sort(key=lambda row: (-_search_score(query, row[1], row[2]), row[0]))
+    return rows[:limit]
+
+
+def search_credentials_menu():
+    query = input("Search for website or username: ")
+    rows = search_credentials(query)
+    if not rows:
+        print("No matching credentials found.\n")
+        return
+    print("\nSearch Results (Decrypted):")
+    print("-" * 60)
+    for row in rows:
+        print(f"ID: {row[0]} | Website: {row[1]} | Username: {row[2]} | Password: {credential_cache.decrypt(row[0], row[3])}")
+    print("-" * 60 + "\n")
+
+
+# ============================================
+# CRUD OPERATIONS
+# ============================================
+@retry_when_busy
+def insert_credential(website, username, password):
+    """Encrypt and store a new credential, returning its ID."""
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute(
+            "INSERT INTO credentials (website, username, password) VALUES (?, ?, ?)",
+            (website, username, encrypt_password(password))
+        )
+    return cursor.lastrowid
+
+@retry_when_busy
+def update_credential_record(credential_id, website, username, password=None, expected_version=None):
+    """Overwrite a stored credential (keeping its password if none is given).
+
+    With expected_version, the write only happens if nobody changed the row
+    since that version was read. Returns False if the ID does not exist or
+    the version did not match.
+    """
+    assignments = "website = ?, username = ?, version = version + 1, updated_at = CURRENT_TIMESTAMP"
+    params = [website, username]
+    if password is not None:
+        assignments += ", password = ?"
+        params.append(encrypt_password(password))
+    condition = "id = ?"
+    params.append(credential_id)
+    if expected_version is not None:
+        condition += " AND version = ?"
+        params.append(expected_version)
+
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute(f"UPDATE credentials SET {assignments} WHERE {condition}", params)
+    credential_cache.invalidate(credential_id)
+    return cursor.rowcount == 1
+
+@retry_when_busy
+def delete_credential_record(credential_id, expected_version=None):
+    """Delete a stored credential. Returns False if the ID does not exist or the version did not match."""
+    conn = get_connection()
+    with conn:
+        if expected_version is None:
+            cursor = conn.execute("DELETE FROM credentials WHERE id = ?", (credential_id,))
+        else:
+            cursor = conn.execute("DELETE FROM credentials WHERE id = ? AND version = ?",
+                                  (credential_id, expected_version))
+    credential_cache.invalidate(credential_id)
+    return cursor.rowcount == 1
+
+#Add Credentials:
+def add_credential():
+    website = input("Enter website name: ")
+    username = input("Enter username: ")
+    password_confirmed = False
+
+    while True:
+        password = input_password("Enter password: ")
+        is_strong, feedback = check_password_strength(password, username)
+        print(feedback)
+
+        if not is_strong:
+            print("This password is weak.")
+
+            while True:
+                print("What would you like to do?")
+                print("1. Use this weak password anyway.")
+                print("2. Make or generate a stronger password.")
+                choice = input("Enter your choice: ")
+
+                if choice == "1":
+                    # Ask to confirm the weak password
+                    while True:
+                        confirm_password = input_password("Confirm your password: ")
+                        if confirm_password == password:
+                            password_confirmed = True
+                            break
+                        else:
+                            print("Passwords do NOT match. Try again.\n")
+                    break
+
+                elif choice == "2":
+                    while True:
+                        print("1. Strengthen it manually")
+                        print("2. Generate a strong one automatically")
+                        sub_choice = input("Enter your choice: ")
+
+                        if sub_choice == "1":
+                            break
+
+                        elif sub_choice == "2":
+                            while True:
+                                print("Generating a strong password for you...")
+                                generated_password = generate_password(username)
+                                print(f"Your generated password is: {generated_password}\n")
+
+                                print("1. Use this generated password")
+                                print("2. Generate another")
+                                print("3. Enter my own password instead")
+                                sub_option = input("Enter your choice: ")
+
+                                if sub_option == "1":
+                                    password = generated_password
+                                    password_confirmed = True
+                                    break
+
+                                elif sub_option == "2":
+                                    continue  # regenerate
+
+                                elif sub_option == "3":
+                                    while True:
+                                        password = input_password("Enter your own password: ")
+                                        is_strong, feedback = check_password_strength(password, username)
+                                        print(feedback)
+                                        if not is_strong:
+                                            print("That password is still weak. Please try again.\n")
+                                            continue
+
+                                        confirm_password = input_password("Confirm your password: ")
+                                        if confirm_password != password:
+                                            print("Passwords do NOT match. Try again.\n")
+                                            continue
+                                        password_confirmed = True
+                                        break
+                                    break
+                                else:
+                                    print("Invalid choice! Try again.\n")
+                            break
+                        else:
+                            print("Invalid choice! Try again.\n")
+                    break
+                else:
+                    print("Invalid choice! Try again.\n")
+            if password_confirmed:
+                break
+        else:
+            break
+
+    if not password_confirmed:
+        confirm_password = input_password("Confirm your password: ")
+        if confirm_password != password:
+            print("Passwords do NOT match. Operation failed.")
+            return
+
+    # Save to DB
+    insert_credential(website, username, password)
+    print("Credential added successfully!\n")
+
+#View Credentials:
+def view_credentials(website=None, username=None, show_passwords=True):
+    """Print matching credentials page by page, decrypting only the rows shown."""
+    shown = 0
+    for row in iter_credentials(website=website, username=username):
+        if shown == 0:
+            print("\nStored Credentials (Decrypted):" if show_passwords else "\nStored Credentials:")
+            print("-" * 60)
+        elif shown % PAGE_SIZE == 0:
+            more = input("-- More (press Enter to continue, 'q' to stop) -- ").strip().lower()
+            if more == 'q':
+                break
+
+        if show_passwords:
+            print(f"ID: {row[0]} | Website: {row[1]} | Username: {row[2]} | Password: {credential_cache.decrypt(row[0], row[3])}")
+        else:
+            print(f"ID: {row[0]} | Website: {row[1]} | Username: {row[2]}")
+        shown += 1
+
+    if shown == 0:
+        print("No credentials found.\n")
+        return
+    print("-" * 60 + "\n")
+
+def choose_credential(action):
+    """Let the user pick one credential by ID without dumping the whole vault."""
+    website = input(f"Filter by website to find the credential to {action} (leave blank to list all): ").strip()
+    view_credentials(website=website or None, show_passwords=False)
+    chosen_id = input(f"Enter the ID of the credential to {action}: ")
+
+    # Validate ID input
+    if not chosen_id.isdigit():
+        print("Invalid ID format. Please enter a numeric ID.\n")
+        return None
+
+    record = get_credential(int(chosen_id))
+    if not record:
+        print(f"No credential found with ID {chosen_id}.\n")
+    return record
+
+#Update Credentials:
+def update_credential():
+    record = choose_credential("update")
+    if not record:
+        return
+    id_to_update = record[0]
+
+    print(f"\nEditing credential for Website: {record[1]} | Username: {record[2]}\n")
+
+    website = input("Enter new website name (leave blank to keep current): ") or record[1]
+    username = input("Enter new username (leave blank to keep current): ") or record[2]
+
+    # Get password and check strength first
+    while True:
+        password = input_password("Enter new password: ")
+        is_strong, feedback = check_password_strength(password, username)
+        print(feedback)
+
+        if not is_strong:
+            confirm = input("Would you still like to use this weak password? (y/n): ").lower()
+            if confirm != 'y':
+                print("Please enter a different password.\n")
+                continue
+        break
+
+    # Confirm password
+    while True:
+        confirm_password = input_password("Confirm your password: ")
+        if confirm_password == password:
+            break
+        print("Passwords do NOT match. Try again.\n")
+
+    # Save to DB, unless someone else changed the credential while we were typing
+    if update_credential_record(id_to_update, website, username, password, expected_version=record[4]):
+        print("\nCredential updated successfully!\n")
+    else:
+        print("\nThis credential was changed or deleted elsewhere while you were editing it. Nothing was saved.\n")
+
+#Delete Credentials:
+def delete_credential():
+    record = choose_credential("delete")
+    if not record:
+        return
+    id_to_delete = record[0]
+
+    # Confirm deletion
+    print(f"\nAre you sure you want to delete this credential?")
+    print(f"Website: {record[1]} | Username: {record[2]}")
+    confirm = input("Type 'yes' to confirm deletion: ").strip().lower()
+
+    if confirm == "yes":
+        if delete_credential_record(id_to_delete, expected_version=record[4]):
+            print("Credential deleted successfully!\n")
+        else:
+            print("This credential was changed or deleted elsewhere in the meantime. Nothing was deleted.\n")
+    else:
+        print("Deletion cancelled.\n")
+
+# ============================================
+# BULK IMPORT
+# ============================================
+IMPORT_BATCH_SIZE = 2000  # Rows encrypted and committed together
+
+# Column names used by Chrome, Firefox, Bitwarden and our own exports
+WEBSITE_FIELDS = ("website", "name", "url", "login_uri", "origin", "hostname")
+USERNAME_FIELDS = ("username", "login_username", "user")
+PASSWORD_FIELDS = ("password", "login_password")
+
+_worker_cipher = None
+_worker_audit_key = None
+
+
+def _init_crypto_worker(keys, record_format=DEFAULT_RECORD_FORMAT):
+    """Give each worker process its own cipher built from the given keys (newest first)."""
+    global _worker_cipher, _worker_audit_key
+    _worker_cipher = VaultCipher(keys, record_format)
+    _worker_audit_key = _audit_hash_key(keys[0])
+
+
+def _crypto_worker_args():
+    """Arguments for _init_crypto_worker that match this process's cipher."""
+    return (load_keys(), get_cipher().record_format)
+
+
+def _encrypt_batch(passwords):
+    """Encrypt a list of passwords inside a worker process."""
+    return [_worker_cipher.encrypt(password.encode()) for password in passwords]
+
+
+def _decrypt_batch(tokens):
+    """Decrypt a list of tokens inside a worker process."""
+    return [_worker_cipher.decrypt(token).decode() for token in tokens]
+
+
+def _rotate_batch(tokens):
+    """Re-encrypt a list of tokens under the newest key (and current format) inside a worker process."""
+    return [_worker_cipher.rotate(token) for token in tokens]
+
+
+def _first_field(record, names):
+    for name in names:
+        value = record.get(name)
+        if value:
+            return str(value).strip()
+    return ""
+
+
+def _normalize_record(record):
+    """Map one exported entry to (website, username, password), or None if unusable."""
+    if not isinstance(record, dict):
+        return None
+    if isinstance(record.get("login"), dict):
+        # Bitwarden JSON keeps the login details in a nested object
+        login = record["login"]
+        uris = login.get("uris") or []
+        record = {
+            "name": record.get("name"),
+            "url": uris[0].get("uri") if isinstance(uris, list) and uris and isinstance(uris[0], dict) else None,
+            "username": login.get("username"),
+            "password": login.get("password"),
+        }
+    website = _first_field(record, WEBSITE_FIELDS)
+    password = _first_field(record, PASSWORD_FIELDS)
+    if not website or not password:
+        return None
+    return website, _first_field(record, USERNAME_FIELDS), password
+
+
+def _read_export(path):
+    """Yield raw entries from a CSV, JSON or JSON-lines export, one at a time."""
+    import csv
+    import json
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        with open(path, newline="", encoding="utf-8-sig") as export_file:
+            yield from csv.DictReader(export_file)
+    elif extension in (".jsonl", ".ndjson"):
+        with open(path, encoding="utf-8") as export_file:
+            for line in export_file:
+                if line.strip():
+                    yield json.loads(line)
+    elif extension == ".json":
+        # Plain JSON has to be parsed in one go; use JSON lines for huge exports
+        with open(path, encoding="utf-8") as export_file:
+            data = json.load(export_file)
+        yield from data.get("items", []) if isinstance(data, dict) else data
+    else:
+        raise ValueError(f"Unsupported export format: {extension or path}")
+
+
+def _read_batches(path, skip, batch_size):
+    """Yield (rows_consumed, entries) batches, skipping entries already imported."""
+    batch, consumed = [], 0
+    for index, record in enumerate(_read_export(path)):
+        if index < skip:
+            continue
+        consumed += 1
+        entry = _normalize_record(record)
+        if entry:
+            batch.append(entry)
+        if consumed == batch_size:
+            yield consumed, batch
+            batch, consumed = [], 0
+    if consumed:
+        yield consumed, batch
+
+
+def import_credentials(path, batch_size=IMPORT_BATCH_SIZE, workers=None):
+    """Import a browser/password manager export into the vault.
+
+    Passwords are encrypted in a process pool and written with executemany,
+    one transaction per batch. Each transaction also records how far into the
+    file we got, so running the import again after an interruption resumes
+    where it stopped. Returns the number of credentials added.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    source = os.path.abspath(path)
+    file_size = os.path.getsize(source)
+    workers = workers or os.cpu_count() or 1
+
+    conn = get_connection()
+    progress = conn.execute(
+        "SELECT file_size, rows_done FROM import_progress WHERE source = ?", (source,)
+    ).fetchone()
+    rows_done = progress[1] if progress and progress[0] == file_size else 0
+    if rows_done:
+        print(f"Resuming import after {rows_done:,} rows.")
+
+    def write_batch(consumed, entries, tokens):
+        nonlocal rows_done, skipped
+        rows_done += consumed
+        skipped += consumed - len(entries)
+        with conn:
+            conn.executemany(
+                "INSERT INTO credentials (website, username, password) VALUES (?, ?, ?)",
+                [(website, username, token) for (website, username, _), token in zip(entries, tokens)]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO import_progress (source, file_size, rows_done) VALUES (?, ?, ?)",
+                (source, file_size, rows_done)
+            )
+
+    imported = skipped = 0
+    start = last_report = time.perf_counter()
+
+    def report(count, force=False):
+        nonlocal last_report
+        now = time.perf_counter()
+        if force or now - last_report >= 1:
+            last_report = now
+            rate = count / max(now - start, 1e-9)
+            print(f"\rImported {count:,} credentials ({rate:,.0f} rows/sec)", end="", flush=True)
+
+    batches = _read_batches(source, rows_done, batch_size)
+    if workers == 1:
+        for consumed, entries in batches:
+            write_batch(consumed, entries, [encrypt_password(entry[2]) for entry in entries])
+            imported += len(entries)
+            report(imported)
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_crypto_worker, initargs=_crypto_worker_args()) as pool:
+            pending = deque()
+            for consumed, entries in batches:
+                pending.append((consumed, entries, pool.submit(_encrypt_batch, [e[2] for e in entries])))
+                # Keep a few batches in flight, but always write them in file order
+                while len(pending) > workers * 2 or (pending and pending[0][2].done()):
+                    consumed, entries, future = pending.popleft()
+                    write_batch(consumed, entries, future.result())
+                    imported += len(entries)
+                    report(imported)
+            while pending:
+                consumed, entries, future = pending.popleft()
+                write_batch(consumed, entries, future.result())
+                imported += len(entries)
+                report(imported)
+
+    with conn:
+        conn.execute("DELETE FROM import_progress WHERE source = ?", (source,))
+    report(imported, force=True)
+    print()
+    if skipped:
+        print(f"Skipped {skipped:,} entries without a website and password.")
+    return imported
+
+
+def import_credentials_menu():
+    import csv
+    import json
+    path = input("Enter the path of the CSV or JSON export: ").strip().strip('"')
+    if not os.path.exists(path):
+        print("File not found.\n")
+        return
+    try:
+        count = import_credentials(path)
+    except (ValueError, KeyError, csv.Error, json.JSONDecodeError) as error:
+        print(f"\nImport failed: {error}\n")
+        return
+    print(f"Imported {count:,} credentials successfully!\n")
+
+# ============================================
+# KEY ROTATION
+# ============================================
+ROTATION_CHUNK_SIZE = 5000  # Rows re-encrypted per transaction
+
+
+def rotation_pending():
+    """True if a key rotation was started and has not finished yet."""
+    return os.path.exists(PENDING_KEY_FILE)
+
+
+def _write_key_file(path, key):
+    """Write a key file atomically so a crash never leaves half a key on disk."""
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as key_file:
+        key_file.write(key)
+        key_file.flush()
+        os.fsync(key_file.fileno())
+    os.replace(temp_path, path)
+
+
+def _reencrypt_credentials(conn, after_id=0, chunk_size=ROTATION_CHUNK_SIZE, workers=None,
+                           checkpoint_sql=None, skip=None):
+    """Re-encrypt credentials with ID > after_id under the current cipher, one chunk per transaction.
+
+    Rows for which skip(token) is true are left alone. checkpoint_sql, if
+    given, is run with the last ID of each chunk inside the chunk's
+    transaction. Returns the number of rows rewritten.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    workers = workers or os.cpu_count() or 1
+    total = conn.execute("SELECT COUNT(*) FROM credentials WHERE id > ?", (after_id,)).fetchone()[0]
+    seen = done = 0
+    start = time.perf_counter()
+    pool = ProcessPoolExecutor(workers, initializer=_init_crypto_worker, initargs=_crypto_worker_args()) if workers > 1 else None
+    try:
+        while True:
+            rows = conn.execute(
+                "SELECT id, password FROM credentials WHERE id > ? ORDER BY id LIMIT ?", (after_id, chunk_size)
+            ).fetchall()
+            if not rows:
+                break
+            after_id = rows[-1][0]
+            seen += len(rows)
+            if skip:
+                rows = [row for row in rows if not skip(row[1])]
+
+            tokens = [row[1] for row in rows]
+            if pool and tokens:
+                step = -(-len(tokens) // workers)  # Ceiling division: one slice per worker
+                slices = [tokens[i:i + step] for i in range(0, len(tokens), step)]
+                rotated = [token for part in pool.map(_rotate_batch, slices) for token in part]
+            else:
+                rotated = [get_cipher().rotate(token) for token in tokens]
+
+            with conn:
+                conn.executemany(
+                    "UPDATE credentials SET password = ? WHERE id = ?",
+                    [(token, row[0]) for token, row in zip(rotated, rows)]
+                )
+                if checkpoint_sql:
+                    conn.execute(checkpoint_sql, (after_id,))
+
+            done += len(rows)
+            rate = seen / max(time.perf_counter() - start, 1e-9)
+            progress = f"{done:,} credentials, checked {seen:,}/{total:,}" if skip else f"{done:,}/{total:,} credentials"
+            print(f"\rRe-encrypted {progress} ({rate:,.0f} rows/sec)", end="", flush=True)
+    finally:
+        if pool:
+            pool.shutdown()
+    if total:
+        print()
+    return done
+
+
+def rotate_key(chunk_size=ROTATION_CHUNK_SIZE, workers=None):
+    """Re-encrypt the whole vault under a fresh key.
+
+    The new key is saved to key.key.new first, and until the rotation finishes
+    every read tries both keys, so rows under either key decrypt fine.
+    Rows are walked in ID order; each chunk is re-encrypted across CPU cores and
+    committed together with a checkpoint, so calling this again after a crash
+    continues from the last committed chunk. Other programs that already have
+    the vault open keep using the old key, so close them before rotating.
+    """
+    from cryptography.fernet import Fernet
+    global _cipher
+    conn = get_connection()
+
+    if not rotation_pending():
+        _write_key_file(PENDING_KEY_FILE, Fernet.generate_key())
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO key_rotation (id, last_id) VALUES (1, 0)")
+    _cipher = load_cipher()
+
+    checkpoint = conn.execute("SELECT last_id FROM key_rotation WHERE id = 1").fetchone()
+    last_id = checkpoint[0] if checkpoint else 0
+    if last_id:
+        print(f"Resuming key rotation after credential ID {last_id}.")
+    done = _reencrypt_credentials(
+        conn, last_id, chunk_size, workers,
+        checkpoint_sql="INSERT OR REPLACE INTO key_rotation (id, last_id) VALUES (1, ?)"
+    )
+
+    secret = load_totp_secret()
+    if secret is not None:
+        set_totp_secret(secret)  # Under the new key too
+
+    # The new key replaces the old one
+    os.replace(PENDING_KEY_FILE, KEY_FILE)
+    with conn:
+        conn.execute("DELETE FROM key_rotation")
+    _cipher = load_cipher()
+    credential_cache.clear()  # Every ciphertext changed
+    return done
+
+
+def convert_records(record_format, chunk_size=ROTATION_CHUNK_SIZE, workers=None):
+    """Switch the vault to another record format and convert the existing rows.
+
+    New records use the chosen format at once. Old rows stay readable while
+    they are rewritten chunk by chunk, and rows already in the new format are
+    skipped, so an interrupted conversion is finished by running it again.
+    Returns the number of rows converted.
+    """
+    global _cipher
+    if record_format not in RECORD_FORMATS:
+        raise ValueError(f"Unknown record format: {record_format} (choose from {', '.join(RECORD_FORMATS)})")
+    if rotation_pending():
+        raise ValueError("Finish the interrupted key rotation first")
+    conn = get_connection()
+    set_setting("record_format", record_format)
+    _cipher = load_cipher()
+
+    done = _reencrypt_credentials(conn, 0, chunk_size, workers,
+                                  skip=lambda token: record_format_of(token) == record_format)
+    credential_cache.clear()
+    return done
+
+
+def rotate_key_menu():
+    print("This re-encrypts every stored credential with a brand-new key.")
+    print("Make sure no other copy of the password manager is running.")
+    confirm = input("Type 'yes' to rotate the encryption key: ").strip().lower()
+    if confirm != "yes":
+        print("Key rotation cancelled.\n")
+        return
+    count = rotate_key()
+    print(f"Key rotated successfully! {count:,} credentials re-encrypted.\n")
+
+# ============================================
+# VAULT AUDIT
+# ============================================
+AUDIT_CHUNK_SIZE = 2000
+AUDIT_REPORT_FILE = "audit_report.json"
+MINHASH_BANDS = 6           # LSH bands ...
+MINHASH_ROWS = 2            # ... of this many MinHash values each
+NEAR_DUPLICATE_SIMILARITY = 0.5  # Estimated Jaccard similarity of character trigrams
+
+# Fixed random masks so every worker computes the same MinHash signature
+_MINHASH_MASKS = [zlib.crc32(b"minhash%d" % i) for i in range(MINHASH_BANDS * MINHASH_ROWS)]
+
+
+def _audit_hash_key(key):
+    """Key for the reuse hashes, derived from the vault key so they mean nothing outside this vault."""
+    import hashlib
+    return hashlib.sha256(b"password-audit" + key).digest()
+
+
+def _minhash_signature(password):
+    """MinHash signature over the password's lowercase character trigrams."""
+    text = password.lower()
+    if len(text) < 3:
+        text = text.ljust(3, "\0")
+    hashes = {zlib.crc32(text[i:i + 3].encode()) for i in range(len(text) - 2)}
+    return tuple(min([h ^ mask for h in hashes]) for mask in _MINHASH_MASKS)
+
+
+def _audit_batch(rows):
+    """Decrypt and score a chunk of (id, website, username, token) rows inside a worker."""
+    import hashlib
+    import hmac
+    passwords = [_worker_cipher.decrypt(row[3]).decode() for row in rows]
+    breached = breached_flags(passwords)
+    results = []
+    for (credential_id, website, username, token), password, is_pwned in zip(rows, passwords, breached):
+        strong, feedback = check_password_strength(password, username, is_pwned)
+        digest = hmac.new(_worker_audit_key, password.encode(), hashlib.sha256).digest()[:16]
+        results.append((credential_id, strong, None if strong else feedback, is_pwned, digest,
+                        _minhash_signature(password)))
+    return results
+
+
+def _signature_similarity(first, second):
+    return sum(a == b for a, b in zip(first, second)) / len(first)
+
+
+def _near_duplicate_groups(signatures):
+    """Cluster similar passwords with MinHash LSH instead of comparing every pair.
+
+    `signatures` maps a representative ID to its signature. Items that land in
+    the same band bucket are compared with the bucket's first item only, which
+    keeps the work linear even when thousands of passwords share a pattern.
+    """
+    parent = {item: item for item in signatures}
+
+    def find(item):
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    for band in range(MINHASH_BANDS):
+        buckets = {}
+        lo = band * MINHASH_ROWS
+        for item, signature in signatures.items():
+            buckets.setdefault(signature[lo:lo + MINHASH_ROWS], []).append(item)
+        for members in buckets.values():
+            anchor = members[0]
+            for item in members[1:]:
+                if _signature_similarity(signatures[anchor], signatures[item]) >= NEAR_DUPLICATE_SIMILARITY:
+                    parent[find(item)] = find(anchor)
+
+    groups = {}
+    for item in signatures:
+        groups.setdefault(find(item), []).append(item)
+    return [members for members in groups.values() if len(members) > 1]
+
+
+def audit_vault(report_path=AUDIT_REPORT_FILE, workers=None, chunk_size=AUDIT_CHUNK_SIZE):
+    """Check every stored password for weakness, reuse and near-duplicates.
+
+    Rows are streamed from the database in chunks and decrypted, scored and
+    checked against the local breach index in a process pool. Reuse is found by grouping keyed hashes of the passwords,
+    and near-duplicates with MinHash LSH. The report (written as JSON) only
+    contains IDs, websites and usernames, never passwords. Returns the report.
+    """
+    import json
+    from concurrent.futures import ProcessPoolExecutor
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    entries = {}
+    weak = []
+    breached = []
+    by_digest = {}
+    signatures = {}
+
+    def collect(results):
+        for credential_id, strong, feedback, is_pwned, digest, signature in results:
+            if not strong:
+                weak.append((credential_id, feedback))
+            if is_pwned:
+                breached.append(credential_id)
+            members = by_digest.setdefault(digest, [])
+            if not members:
+                signatures[credential_id] = signature
+            members.append(credential_id)
+
+    def chunks():
+        chunk = []
+        for row in iter_credentials(chunk_size=chunk_size):
+            entries[row[0]] = (row[1], row[2])
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    if workers == 1:
+        _init_crypto_worker(*_crypto_worker_args())
+        for chunk in chunks():
+            collect(_audit_batch(chunk))
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_crypto_worker, initargs=_crypto_worker_args()) as pool:
+            pending = deque()
+            for chunk in chunks():
+                pending.append(pool.submit(_audit_batch, chunk))
+                while len(pending) > workers * 2:
+                    collect(pending.popleft().result())
+            while pending:
+                collect(pending.popleft().result())
+
+    def describe(ids):
+        return [{"id": i, "website": entries[i][0], "username": entries[i][1]} for i in sorted(ids)]
+
+    reused = [ids for ids in by_digest.values() if len(ids) > 1]
+    # Near-duplicate groups are found among distinct passwords, then expanded with their exact copies
+    representative = {ids[0]: ids for ids in by_digest.values()}
+    near_duplicates = [
+        [i for rep in group for i in representative[rep]]
+        for group in _near_duplicate_groups(signatures)
+    ]
+
+    report = {
+        "generated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "total_credentials": len(entries),
+        "weak_count": len(weak),
+        "breached_count": len(breached),
+        "reused_group_count": len(reused),
+        "near_duplicate_group_count": len(near_duplicates),
+        "seconds": round(time.perf_counter() - start, 3),
+        "weak": [dict(describe([i])[0], feedback=feedback) for i, feedback in sorted(weak)],
+        "breached": describe(breached),
+        "reused": sorted((describe(ids) for ids in reused), key=len, reverse=True),
+        "near_duplicates": sorted((describe(ids) for ids in near_duplicates), key=len, reverse=True),
+    }
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as report_file:
+            json.dump(report, report_file)
+    return report
+
+
+def audit_vault_menu():
+    print("Auditing your vault...")
+    report = audit_vault()
+    print("-" * 60)
+    print(f"Credentials checked:       {report['total_credentials']:,}")
+    print(f"Weak passwords:            {report['weak_count']:,}")
+    print(f"Found in data breaches:    {report['breached_count']:,}")
+    print(f"Reused password groups:    {report['reused_group_count']:,}")
+    print(f"Near-duplicate groups:     {report['near_duplicate_group_count']:,}")
+    print("-" * 60)
+    print(f"Full report saved to {AUDIT_REPORT_FILE} ({report['seconds']}s)\n")
+
+# ============================================
+# BACKUP AND RESTORE
+# ============================================
+# An archive is BACKUP_MAGIC, a length-prefixed JSON header, then chunks of
+# up to BACKUP_CHUNK_ROWS JSON-lines records. Each chunk is zlib-compressed and
+# sealed with AES-GCM under the backup key, authenticating the header, the
+# chunk number and a "last chunk" flag along with it, so reordered, mixed up
+# or truncated archives are rejected. Passwords are stored decrypted inside
+# the sealed chunks, so archives do not depend on key.key and survive key
+# rotations.
+BACKUP_KEY_FILE = "backup.key"
+BACKUP_MAGIC = b"SPMBAK1\n"
+BACKUP_CHUNK_ROWS = 5000
+BACKUP_COMPRESSION = 6  # zlib level
+
+
+def load_backup_key(create=True):
+    """Read the archive key, creating it on first use."""
+    import base64
+    if not os.path.exists(BACKUP_KEY_FILE):
+        if not create:
+            raise ValueError(f"{BACKUP_KEY_FILE} not found; copy the backup key next to the vault first")
+        _write_key_file(BACKUP_KEY_FILE, base64.urlsafe_b64encode(os.urandom(32)))
+        print(f"Backup key generated and saved to {BACKUP_KEY_FILE}. Keep a copy somewhere safe: "
+              "archives cannot be restored without it.")
+    with open(BACKUP_KEY_FILE, "rb") as key_file:
+        return base64.urlsafe_b64decode(key_file.read().strip())
+
+
+def _key_fingerprint(key):
+    import hashlib
+    return hashlib.sha256(b"backup-key" + key).hexdigest()[:16]
+
+
+def _seal_chunk(aead, header, index, records, last):
+    import json
+    payload = zlib.compress("".join(json.dumps(record) + "\n" for record in records).encode(), BACKUP_COMPRESSION)
+    nonce = os.urandom(12)
+    sealed = aead.encrypt(nonce, payload, header + struct.pack(">Q?", index, last))
+    return struct.pack(">I?", len(sealed), last) + nonce + sealed
+
+
+def _read_archive_header(archive):
+    """Read the header of an open archive, returning (raw bytes, parsed dict)."""
+    import json
+    if archive.read(len(BACKUP_MAGIC)) != BACKUP_MAGIC:
+        raise ValueError(f"{archive.name} is not a vault backup")
+    (length,) = struct.unpack(">I", archive.read(4))
+    header = archive.read(length)
+    return header, json.loads(header)
+
+
+def _archive_chunks(archive, header, aead):
+    """Yield the records of each chunk of an archive whose header has been read."""
+    import json
+    from cryptography.exceptions import InvalidTag
+    index = 0
+    while True:
+        prefix = archive.read(5)
+        if len(prefix) < 5:
+            raise ValueError(f"{archive.name} is truncated")
+        length, last = struct.unpack(">I?", prefix)
+        nonce, sealed = archive.read(12), archive.read(length)
+        try:
+            payload = aead.decrypt(nonce, sealed, header + struct.pack(">Q?", index, last))
+        except InvalidTag:
+            raise ValueError(f"{archive.name} is damaged or was made with another backup key")
+        yield [json.loads(line) for line in zlib.decompress(payload).splitlines()]
+        if last:
+            return
+        index += 1
+
+
+def _in_order(pool, function, jobs, depth):
+    """Run function(argument) for each (context, argument) job, yielding (context, result) in job order.
+
+    With a pool, at most `depth` jobs are in flight so memory stays flat.
+    Without one, the jobs run here (the caller has set up the worker cipher).
+    """
+    if pool is None:
+        for context, argument in jobs:
+            yield context, function(argument)
+        return
+    pending = deque()
+    for context, argument in jobs:
+        pending.append((context, pool.submit(function, argument)))
+        if len(pending) > depth:
+            context, future = pending.popleft()
+            yield context, future.result()
+    while pending:
+        context, future = pending.popleft()
+        yield context, future.result()
+
+
+def _backup_position(name):
+    """A saved (change counter, highest ID) pair, or None."""
+    import json
+    value = get_setting(name)
+    return json.loads(value) if value else None
+
+
+def backup_vault(path, full=False, workers=None):
+    """Write an encrypted archive of the rows changed since the last backup, or of everything.
+
+    The first backup, a backup with full=True, or the first one after the
+    backup key changed starts a new chain. Otherwise only rows added or edited
+    since the previous backup are written, plus tombstones for deleted rows.
+    Rows are read, decrypted and written one chunk at a time. Returns a
+    summary dict.
+    """
+    import json
+    from concurrent.futures import ProcessPoolExecutor
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    key = load_backup_key()
+    fingerprint = _key_fingerprint(key)
+    chain = get_setting("backup_chain")
+    since = _backup_position("backup_position")
+    if full or chain is None or since is None or get_setting("backup_key") != fingerprint:
+        chain, since = os.urandom(8).hex(), None
+    workers = workers or os.cpu_count() or 1
+    aead = AESGCM(key)
+
+    # A connection of its own, so the whole archive comes from one snapshot
+    snapshot = _open_connection()
+    snapshot.execute("BEGIN")
+    try:
+        change = snapshot.execute("SELECT value FROM change_counter WHERE id = 1").fetchone()[0]
+        highest = snapshot.execute("SELECT seq FROM sqlite_sequence WHERE name = 'credentials'").fetchone()
+        through = [change, highest[0] if highest else 0]
+        header = json.dumps({"chain": chain, "since": since, "through": through, "key": fingerprint,
+                             "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}).encode()
+        columns = "id, website, username, password, created_at, updated_at, version, change_seq"
+
+        def jobs():
+            # Rows added since the last backup (all rows for a full one), by ID
+            last_id = since[1] if since else 0
+            while True:
+                rows = snapshot.execute(f"SELECT {columns} FROM credentials WHERE id > ? ORDER BY id LIMIT ?",
+                                        (last_id, BACKUP_CHUNK_ROWS)).fetchall()
+                if not rows:
+                    break
+                yield rows, [row[3] for row in rows]
+                last_id = rows[-1][0]
+            if not since:
+                return
+            # Older rows edited since the last backup, by change number
+            last_change = since[0]
+            while True:
+                rows = snapshot.execute(
+                    f"SELECT {columns} FROM credentials WHERE change_seq > ? AND id <= ? ORDER BY change_seq LIMIT ?",
+                    (last_change, since[1], BACKUP_CHUNK_ROWS)
+                ).fetchall()
+                if not rows:
+                    return
+                yield rows, [row[3] for row in rows]
+                last_change = rows[-1][7]
+
+        written = deleted = 0
+        index = 0
+        temp_path = path + ".tmp"
+        if workers == 1:
+            _init_crypto_worker(*_crypto_worker_args())
+        pool = ProcessPoolExecutor(workers, initializer=_init_crypto_worker, initargs=_crypto_worker_args()) if workers > 1 else None
+        try:
+            with open(temp_path, "wb") as archive:
+                archive.write(BACKUP_MAGIC + struct.pack(">I", len(header)) + header)
+                for rows, passwords in _in_order(pool, _decrypt_batch, jobs(), workers * 2):
+                    records = [{"id": row[0], "website": row[1], "username": row[2], "password": password,
+                                "created_at": row[4], "updated_at": row[5], "version": row[6]}
+                               for row, password in zip(rows, passwords)]
+                    archive.write(_seal_chunk(aead, header, index, records, False))
+                    index += 1
+                    written += len(records)
+                    print(f"\rBacked up {written:,} credentials", end="", flush=True)
+
+                last_id = 0
+                while since:
+                    tombstones = snapshot.execute(
+                        "SELECT id FROM tombstones WHERE change_seq > ? AND id > ? ORDER BY id LIMIT ?",
+                        (since[0], last_id, BACKUP_CHUNK_ROWS)
+                    ).fetchall()
+                    if not tombstones:
+                        break
+                    archive.write(_seal_chunk(aead, header, index, [{"deleted": row[0]} for row in tombstones], False))
+                    index += 1
+                    deleted += len(tombstones)
+                    last_id = tombstones[-1][0]
+
+                archive.write(_seal_chunk(aead, header, index, [], True))
+                archive.flush()
+                os.fsync(archive.fileno())
+        finally:
+            if pool:
+                pool.shutdown()
+        os.replace(temp_path, path)
+    finally:
+        snapshot.rollback()
+        snapshot.close()
+    if written:
+        print()
+
+    set_setting("backup_chain", chain)
+    set_setting("backup_position", json.dumps(through))
+    set_setting("backup_key", fingerprint)
+    conn = get_connection()
+    with conn:
+        # Later incrementals only need deletions after this point
+        conn.execute("DELETE FROM tombstones WHERE change_seq <= ?", (change,))
+    return {"archive": path, "kind": "incremental" if since else "full", "chain": chain,
+            "since": since, "through": through, "rows": written, "deleted": deleted,
+            "bytes": os.path.getsize(path)}
+
+
+def restore_backup(paths, workers=None):
+    """Replay a full archive and then its incrementals, in order, into this vault.
+
+    A full archive can only be restored into an empty vault. Incrementals can
+    also be applied later to a vault restored from the same chain, continuing
+    where the last restore stopped. Returns a summary dict.
+    """
+    import json
+    from concurrent.futures import ProcessPoolExecutor
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    key = load_backup_key(create=False)
+    aead = AESGCM(key)
+    conn = get_connection()
+
+    # Check the whole chain before changing anything
+    headers = []
+    for path in paths:
+        with open(path, "rb") as archive:
+            headers.append(_read_archive_header(archive)[1])
+    chain, position = get_setting("restore_chain"), _backup_position("restore_position")
+    if headers[0]["since"] is None:
+        if count_credentials():
+            raise ValueError("A full backup can only be restored into an empty vault")
+        chain, position = headers[0]["chain"], None
+    for path, header in zip(paths, headers):
+        if header["key"] != _key_fingerprint(key):
+            raise ValueError(f"{path} was made with another backup key")
+        if header["chain"] != chain or header["since"] != position:
+            raise ValueError(f"{path} does not continue the backup chain; give the archives in order")
+        position = header["through"]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _init_crypto_worker(*_crypto_worker_args())
+    pool = ProcessPoolExecutor(workers, initializer=_init_crypto_worker, initargs=_crypto_worker_args()) if workers > 1 else None
+    restored = deleted = 0
+    try:
+        for path in paths:
+            with open(path, "rb") as archive:
+                raw_header, header = _read_archive_header(archive)
+                jobs = ((records, [record["password"] for record in records if "deleted" not in record])
+                        for records in _archive_chunks(archive, raw_header, aead))
+                for records, tokens in _in_order(pool, _encrypt_batch, jobs, workers * 2):
+                    rows = [record for record in records if "deleted" not in record]
+                    gone = [(record["deleted"],) for record in records if "deleted" in record]
+                    with conn:
+                        conn.executemany('''
+                            INSERT INTO credentials (id, website, username, password, created_at, updated_at, version)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)
+                            ON CONFLICT (id) DO UPDATE SET
+                                website = excluded.website, username = excluded.username,
+                                password = excluded.password, created_at = excluded.created_at,
+                                updated_at = excluded.updated_at, version = excluded.version
+                        ''', [(row["id"], row["website"], row["username"], token, row["created_at"],
+                               row["updated_at"], row["version"]) for row, token in zip(rows, tokens)])
+                        conn.executemany("DELETE FROM credentials WHERE id = ?", gone)
+                    restored += len(rows)
+                    deleted += len(gone)
+                    if rows:
+                        print(f"\rRestored {restored:,} credentials", end="", flush=True)
+            set_setting("restore_chain", chain)
+            set_setting("restore_position", json.dumps(header["through"]))
+    finally:
+        if pool:
+            pool.shutdown()
+    if restored:
+        print()
+    credential_cache.clear()
+    return {"archives": len(paths), "chain": chain, "through": position, "rows": restored, "deleted": deleted}
+
+
+# ============================================
+# MAIN MENU
+# ============================================
+def main():
+    generate_key()
+    init_db()
+    number_of_tries = 0
+
+    
+    while True:
+        if number_of_tries == 2:
+            while True:
+                print("It seems like you have forgotten your password, would you like to reset it?")
+                print("1. Yes, I would like to reset my password.")
+                print("2. No, I remember my password.")
+                print("3. Exit")
+                choice = input("Enter your choice: ")
+
+                if choice == '1':
+                    if reset_code_verified():
+                        new_master = input_password("Enter your new master password: ")
+                        confirm_master = input_password("Confirm your password: ")
+                        if new_master == confirm_master:
+                            set_master_password(new_master)
+                            print("Password reset successful!")
+                            number_of_tries = 0
+                            break
+                        else:
+                            print("Passwords do NOT match. Operation Failed.")
+                elif choice == '2':
+                    number_of_tries = 1
+                    break
+                elif choice == '3':
+                    print("Exiting Secure Password Manager. Goodbye!")
+                    sys.exit()
+                else:
+                    print("Invalid choice! Please try again.\n")
+
+        print("========== Secure Password Manager ==========")
+        entered_password = input_password("Enter Password: ")
+        if verify_master_password(entered_password):
+            number_of_tries = 0
+            if rotation_pending():
+                print("A previous key rotation did not finish. Resuming it now...")
+                rotate_key()
+            while True:
+                print("============================================")
+                print("1. Add Credential")
+                print("2. View Credentials")
+                print("3. Update Credential")
+                print("4. Delete Credential")
+                print("5. Search Credentials")
+                print("6. Import Credentials")
+                print("7. Audit Vault")
+                print("8. Load Breached Password List")
+                print("9. Rotate Encryption Key")
+                print("10. Set Up Authenticator App")
+                print("11. Exit")
+                choice = input("Enter your choice: ")
+
+                if choice == '1':
+                    add_credential()
+                elif choice == '2':
+                    view_credentials()
+                elif choice == '3':
+                    update_credential()
+                elif choice == '4':
+                    delete_credential()
+                elif choice == '5':
+                    search_credentials_menu()
+                elif choice == '6':
+                    import_credentials_menu()
+                elif choice == '7':
+                    audit_vault_menu()
+                elif choice == '8':
+                    build_breach_index_menu()
+                elif choice == '9':
+                    rotate_key_menu()
+                elif choice == '10':
+                    setup_totp_menu()
+                elif choice == '11':
+                    print("Exiting Secure Password Manager. Goodbye!")
+                    return
+                else:
+                    print("Invalid choice! Please try again.\n")
+        else:
+            number_of_tries += 1
+            print("Incorrect Password.")
+
+
+
+# ============================================
+# COMMAND LINE INTERFACE
+# ============================================
+MASTER_PASSWORD_ENV = "SPM_MASTER_PASSWORD"
+
+
+class CommandError(Exception):
+    """A scripted command failed; the message is reported back as JSON."""
+
+
+def _credential_json(row, show_password=True):
+    record = {"id": row[0], "website": row[1], "username": row[2]}
+    if show_password:
+        record["password"] = credential_cache.decrypt(row[0], row[3])
+    if len(row) > 4:
+        record["version"] = row[4]
+    return record
+
+
+def _version_param(params, row):
+    """The version the client last saw, or the one just read when it did not send any."""
+    if params.get("version") is None:
+        return row[4]
+    try:
+        return int(params["version"])
+    except (TypeError, ValueError):
+        raise CommandError("'version' must be a number")
+
+
+STRING_PARAMS = ("website", "username", "password", "query", "special_chars")
+NUMBER_PARAMS = ("id", "version", "limit", "page", "length", "count")
+SQLITE_MAX_INT = 2 ** 63 - 1  # Numbers must fit SQLite's signed 64-bit INTEGER
+
+
+def _checked_params(params):
+    """Reject parameters of the wrong type (e.g. {"website": 5}) before any command runs."""
+    for name in STRING_PARAMS:
+        if params.get(name) is not None and not isinstance(params[name], str):
+            raise CommandError(f"'{name}' must be a string")
+    for name in NUMBER_PARAMS:
+        value = params.get(name)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, str))
+                                  or isinstance(value, str) and not value.strip().lstrip("-").isdigit()):
+            raise CommandError(f"'{name}' must be a whole number")
+        if value is not None and not -SQLITE_MAX_INT - 1 <= int(value) <= SQLITE_MAX_INT:
+            raise CommandError(f"'{name}' is out of range")
+    return params
+
+
+def _require_id(params):
+    try:
+        return int(params["id"])
+    except (KeyError, TypeError, ValueError):
+        raise CommandError("A numeric 'id' is required")
+
+
+def _password_param(params, username):
+    """Use the given password, or generate one when 'generate' is set."""
+    if params.get("generate"):
+        return generate_password(username, int(params.get("length") or DEFAULT_PASSWORD_LENGTH))
+    if params.get("password"):
+        return params["password"]
+    raise CommandError("Either 'password' or 'generate' is required")
+
+
+def _command_get(params):
+    if params.get("id") is not None:
+        row = get_credential(_require_id(params))
+        rows = [row] if row else []
+    elif params.get("website"):
+        rows = list(iter_credentials(website=params["website"], username=params.get("username"),
+                                     limit=int(params.get("limit") or SEARCH_LIMIT)))
+    else:
+        raise CommandError("'id' or 'website' is required")
+    if not rows:
+        raise CommandError("No matching credential found")
+    for row in rows:
+        yield _credential_json(row)
+
+
+def _command_add(params):
+    website, username = params.get("website"), params.get("username") or ""
+    if not website:
+        raise CommandError("'website' is required")
+    password = _password_param(params, username)
+    is_strong, feedback = check_password_strength(password, username)
+    record = {"id": insert_credential(website, username, password), "website": website,
+              "username": username, "strong": is_strong, "feedback": feedback.strip()}
+    if params.get("generate"):
+        record["password"] = password
+    yield record
+
+
+def _command_update(params):
+    credential_id = _require_id(params)
+    row = get_credential(credential_id)
+    if not row:
+        raise CommandError(f"No credential found with ID {credential_id}")
+    website = params.get("website") or row[1]
+    username = params.get("username") or row[2]
+    password = None
+    if params.get("password") or params.get("generate"):
+        password = _password_param(params, username)
+    version = _version_param(params, row)
+    if not update_credential_record(credential_id, website, username, password, expected_version=version):
+        raise CommandError(f"Credential {credential_id} was changed by someone else; read it again and retry")
+    record = {"id": credential_id, "website": website, "username": username, "version": version + 1}
+    if params.get("generate"):
+        record["password"] = password
+    yield record
+
+
+def _command_delete(params):
+    credential_id = _require_id(params)
+    row = get_credential(credential_id)
+    if not row:
+        raise CommandError(f"No credential found with ID {credential_id}")
+    if not delete_credential_record(credential_id, expected_version=_version_param(params, row)):
+        raise CommandError(f"Credential {credential_id} was changed by someone else; read it again and retry")
+    yield {"id": credential_id, "deleted": True}
+
+
+def _command_list(params):
+    limit = int(params["limit"]) if params.get("limit") else None
+    offset = 0
+    if params.get("page"):
+        limit = limit or PAGE_SIZE
+        offset = (int(params["page"]) - 1) * limit
+    rows = iter_credentials(website=params.get("website"), username=params.get("username"),
+                            offset=offset, limit=limit)
+    for row in rows:
+        yield _credential_json(row, bool(params.get("show_passwords")))
+
+
+def _command_search(params):
+    if not params.get("query"):
+        raise CommandError("'query' is required")
+    for row in search_credentials(params["query"], int(params.get("limit") or SEARCH_LIMIT)):
+        yield _credential_json(row, bool(params.get("show_passwords")))
+
+
+def _command_generate(params):
+    options = {
+        "length": int(params.get("length") or DEFAULT_PASSWORD_LENGTH),
+        "lowercase": not params.get("no_lowercase"),
+        "uppercase": not params.get("no_uppercase"),
+        "digits": not params.get("no_digits"),
+        "special_chars": "" if params.get("no_special") else params.get("special_chars") or SPECIAL_CHARS,
+    }
+    try:
+        passwords = generate_passwords(int(params.get("count") or 1), params.get("username") or "", **options)
+    except ValueError as error:
+        raise CommandError(str(error))
+    for password in passwords:
+        yield {"password": password}
+
+
+COMMANDS = {
+    "get": _command_get,
+    "add": _command_add,
+    "update": _command_update,
+    "delete": _command_delete,
+    "list": _command_list,
+    "search": _command_search,
+    "generate": _command_generate,
+}
+
+
+def _emit(record):
+    import json
+    sys.stdout.write(json.dumps(record) + "\n")
+
+
+def _run_command(name, params, extra=None):
+    """Run one command, writing one JSON line per result (or one error line). Returns True on success."""
+    import sqlite3
+    try:
+        for record in COMMANDS[name](_checked_params(params)):
+            _emit(dict(record, **extra) if extra else record)
+        return True
+    except (CommandError, ValueError, OverflowError, sqlite3.Error) as error:
+        _emit(dict({"error": str(error)}, **(extra or {})))
+        return False
+
+
+def _run_batch():
+    """Serve JSON-lines requests from stdin, e.g. {"command": "get", "website": "github"}."""
+    import json
+    ok = True
+    for number, line in enumerate(sys.stdin, start=1):
+        if not line.strip():
+            continue
+        try:
+            params = json.loads(line)
+            if not isinstance(params, dict):
+                raise ValueError("not an object")
+            name = params.pop("command")
+        except (ValueError, KeyError):
+            _emit({"error": "Each line must be a JSON object with a 'command'", "line": number})
+            ok = False
+            continue
+        if not isinstance(name, str) or name not in COMMANDS:
+            _emit({"error": f"Unknown command: {name}", "line": number})
+            ok = False
+            continue
+        ok = _run_command(name, params, {"line": number}) and ok
+        sys.stdout.flush()
+    return ok
+
+
+def _read_master_password(password_fd):
+    """Read the master password from a file descriptor, or the environment."""
+    if password_fd is not None:
+        with os.fdopen(password_fd, "r", closefd=False) as source:
+            return source.readline().rstrip("\r\n")
+    return os.environ.get(MASTER_PASSWORD_ENV)
+
+
+def _build_parser():
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog="SecurePasswordManager.py",
+        description="Scripted access to the vault. Run without arguments for the interactive menu. "
+                    f"The master password is read from --password-fd or ${MASTER_PASSWORD_ENV}.",
+        epilog="--profile[=stats.json] and --cprofile=out.prof (or $SPM_PROFILE / $SPM_CPROFILE) report "
+               "where the time went when the program exits; they work with the interactive menu too.",
+    )
+    parser.add_argument("--password-fd", type=int, help="read the master password from this file descriptor")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    get = commands.add_parser("get", help="print a credential with its password")
+    get.add_argument("--id", type=int)
+    get.add_argument("--website")
+    get.add_argument("--username")
+
+    for name, help_text in (("add", "store a new credential"), ("update", "change a stored credential")):
+        command = commands.add_parser(name, help=help_text)
+        if name == "update":
+            command.add_argument("--id", type=int, required=True)
+        command.add_argument("--website", required=name == "add")
+        command.add_argument("--username")
+        command.add_argument("--password", help="prefer batch mode or --generate to keep it out of ps")
+        command.add_argument("--generate", action="store_true", help="generate a strong password")
+        command.add_argument("--length", type=int)
+        if name == "update":
+            command.add_argument("--version", type=int, help="fail if the credential changed since this version")
+
+    delete = commands.add_parser("delete", help="delete a credential")
+    delete.add_argument("--id", type=int, required=True)
+    delete.add_argument("--version", type=int, help="fail if the credential changed since this version")
+
+    listing = commands.add_parser("list", help="list credentials")
+    listing.add_argument("--website")
+    listing.add_argument("--username")
+    listing.add_argument("--page", type=int)
+    listing.add_argument("--limit", type=int)
+    listing.add_argument("--show-passwords", action="store_true")
+
+    search = commands.add_parser("search", help="fuzzy search by website or username")
+    search.add_argument("query")
+    search.add_argument("--limit", type=int)
+    search.add_argument("--show-passwords", action="store_true")
+
+    generate = commands.add_parser("generate", help="generate passwords (no master password needed)")
+    generate.add_argument("--count", type=int, default=1)
+    generate.add_argument("--length", type=int)
+    generate.add_argument("--username", help="keep the passwords dissimilar to this username")
+    generate.add_argument("--special-chars")
+    for option in ("lowercase", "uppercase", "digits", "special"):
+        generate.add_argument(f"--no-{option}", action="store_true")
+
+    commands.add_parser("batch", help="read JSON-lines commands from stdin")
+
+    dictionary = commands.add_parser("load-dictionary",
+                                     help="build the strength checker's word list (no master password needed)")
+    dictionary.add_argument("word_lists", nargs="+", help="text files with one word per line, most common first")
+
+    convert = commands.add_parser("convert-records", help="store passwords in another record format")
+    convert.add_argument("record_format", choices=RECORD_FORMATS,
+                         help="v2 is compact AES-GCM; fernet is the original format")
+
+    backup = commands.add_parser("backup", help="write an encrypted archive of changes since the last backup")
+    backup.add_argument("archive")
+    backup.add_argument("--full", action="store_true", help="archive every row and start a new chain")
+
+    restore = commands.add_parser("restore", help="replay a full backup and its incrementals into this vault")
+    restore.add_argument("archives", nargs="+", help="the full archive first, then incrementals in order")
+
+    calibrate = commands.add_parser("calibrate-kdf", help="re-tune the master password KDF for this machine")
+    calibrate.add_argument("--target-ms", type=float, default=KDF_TARGET_SECONDS * 1000,
+                           help="how long one unlock should take")
+
+    agent = commands.add_parser("agent", help="unlock once and serve get/search/list/generate on a Unix socket")
+    agent.add_argument("--socket", default=AGENT_SOCKET)
+    agent.add_argument("--idle-timeout", type=float, default=AGENT_IDLE_TIMEOUT,
+                       help="seconds without requests before locking (0 never locks)")
+    agent.add_argument("--request-timeout", type=float, default=AGENT_REQUEST_TIMEOUT)
+    return parser
+
+
+def run_cli(argv):
+    """Entry point for scripted use. Returns the process exit code."""
+    args = _build_parser().parse_args(argv)
+    params = {key: value for key, value in vars(args).items() if value is not None and key != "password_fd"}
+    name = params.pop("command")
+
+    if name == "generate":
+        return 0 if _run_command(name, params) else 1
+    if name == "load-dictionary":
+        try:
+            count = build_word_index(params["word_lists"])
+        except OSError as error:
+            _emit({"error": str(error)})
+            return 1
+        _emit({"dictionary": WORD_INDEX_FILE, "words": count})
+        return 0
+
+    new_vault = not os.path.exists(DB_FILE)
+    if new_vault and name != "restore":
+        _emit({"error": "No vault found. Run the program interactively once to create it."})
+        return 1
+    with redirect_stdout(sys.stderr):  # Upgrade and first-run messages would break the JSON lines
+        init_db()
+    # Restoring into a vault created just now: it is empty and still has the default password
+    entered_password = "1" if new_vault else _read_master_password(args.password_fd)
+    if entered_password is None:
+        _emit({"error": f"Master password required (--password-fd or ${MASTER_PASSWORD_ENV})"})
+        return 2
+    if not verify_master_password(entered_password):
+        _emit({"error": "Incorrect master password"})
+        return 2
+
+    if name == "batch":
+        return 0 if _run_batch() else 1
+    if name == "convert-records":
+        with redirect_stdout(sys.stderr):  # Progress output would break the JSON lines
+            count = convert_records(params["record_format"])
+        _emit({"record_format": params["record_format"], "converted": count})
+        return 0
+    if name in ("backup", "restore"):
+        try:
+            with redirect_stdout(sys.stderr):
+                if name == "backup":
+                    summary = backup_vault(params["archive"], full=params.get("full", False))
+                else:
+                    summary = restore_backup(params["archives"])
+        except (OSError, ValueError) as error:
+            _emit({"error": str(error)})
+            return 1
+        _emit(summary)
+        return 0
+    if name == "calibrate-kdf":
+        n, r, p, seconds = calibrate_kdf(params["target_ms"] / 1000)
+        set_master_password(entered_password, (n, r, p))
+        _emit({"n": n, "r": r, "p": p, "unlock_ms": round(seconds * 1000, 1)})
+        return 0
+    if name == "agent":
+        return run_agent(params["socket"], params["idle_timeout"], params["request_timeout"])
+    return 0 if _run_command(name, params) else 1
+
+# ============================================
+# VAULT AGENT
+# ============================================
+AGENT_SOCKET = "spm-agent.sock"
+AGENT_IDLE_TIMEOUT = 15 * 60  # Seconds without requests before the agent locks itself
+AGENT_REQUEST_TIMEOUT = 5     # Seconds a single request may take
+AGENT_COMMANDS = ("get", "list", "search", "generate")
+
+
+def _collect_results(name, params):
+    return list(COMMANDS[name](_checked_params(params)))
+
+
+def _lock_vault():
+    """Forget the cipher and close the database so nothing sensitive stays open."""
+    global _cipher
+    credential_cache.clear()
+    close_connections()
+    _cipher = None
+
+
+class VaultAgent:
+    """Keeps the vault unlocked in one process and answers JSON-lines requests on a Unix socket.
+
+    Vault access runs on a single worker thread, so the SQLite connection is
+    never used from two threads at once while the event loop serves many
+    clients concurrently.
+    """
+
+    def __init__(self, socket_path=AGENT_SOCKET, idle_timeout=AGENT_IDLE_TIMEOUT,
+                 request_timeout=AGENT_REQUEST_TIMEOUT):
+        from concurrent.futures import ThreadPoolExecutor
+        self.socket_path = socket_path
+        self.idle_timeout = idle_timeout
+        self.request_timeout = request_timeout
+        self.locked = False
+        self.last_used = time.monotonic()
+        self._vault_thread = ThreadPoolExecutor(max_workers=1)
+
+    async def _in_vault_thread(self, function, *args):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        return await asyncio.wait_for(loop.run_in_executor(self._vault_thread, function, *args),
+                                      self.request_timeout)
+
+    async def lock(self):
+        if not self.locked:
+            self.locked = True
+            await self._in_vault_thread(_lock_vault)
+
+    async def dispatch(self, request):
+        """Answer one request object with one response object."""
+        name = request.pop("command", None)
+        if name == "status":
+            return {"locked": self.locked, "idle_timeout": self.idle_timeout, "cache": credential_cache.stats()}
+        if name == "lock":
+            await self.lock()
+            return {"locked": True}
+        if name == "unlock":
+            if not isinstance(request.get("password"), str):
+                return {"error": "'password' must be a string"}
+            if not await self._in_vault_thread(verify_master_password, request.get("password")):
+                return {"error": "Incorrect master password"}
+            self.locked = False
+            self.last_used = time.monotonic()
+            return {"locked": False}
+        if name not in AGENT_COMMANDS:
+            return {"error": f"Unknown command: {name}"}
+        if self.locked and name != "generate":
+            return {"error": "Vault is locked", "locked": True}
+
+        self.last_used = time.monotonic()
+        return {"results": await self._in_vault_thread(_collect_results, name, request)}
+
+    async def handle_client(self, reader, writer):
+        import asyncio
+        import json
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError
+                except ValueError:
+                    response = {"error": "Each line must be a JSON object with a 'command'"}
+                else:
+                    try:
+                        response = await self.dispatch(request)
+                    except asyncio.TimeoutError:
+                        response = {"error": "Request timed out"}
+                    except (CommandError, ValueError) as error:
+                        response = {"error": str(error)}
+                    except Exception as error:  # Any other failure answers this request; the agent keeps serving
+                        response = {"error": f"Request failed: {type(error).__name__}: {error}"}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass  # Client went away or sent an oversized line
+        finally:
+            writer.close()
+
+    async def watch_idle(self):
+        import asyncio
+        while True:
+            await asyncio.sleep(min(self.idle_timeout, 5))
+            if not self.locked and time.monotonic() - self.last_used >= self.idle_timeout:
+                try:
+                    await self.lock()
+                except asyncio.TimeoutError:
+                    pass  # A slow request is still running; try again on the next tick
+
+    async def serve(self):
+        import asyncio
+        import signal
+        # Create the socket readable and writable by this user only
+        old_umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(self.handle_client, path=self.socket_path)
+        finally:
+            os.umask(old_umask)
+        os.chmod(self.socket_path, 0o600)
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signal_number, stop.set)
+        _emit({"agent": os.path.abspath(self.socket_path), "pid": os.getpid()})
+        sys.stdout.flush()
+
+        watcher = asyncio.create_task(self.watch_idle()) if self.idle_timeout else None
+        async with server:
+            await stop.wait()
+        if watcher:
+            watcher.cancel()
+
+
+def _agent_running(socket_path):
+    import socket
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+        return True
+    except OSError:
+        return False
+    finally:
+        probe.close()
+
+
+def run_agent(socket_path=AGENT_SOCKET, idle_timeout=AGENT_IDLE_TIMEOUT, request_timeout=AGENT_REQUEST_TIMEOUT):
+    """Serve the unlocked vault on a Unix socket until interrupted. Returns the exit code."""
+    import asyncio
+    import socket
+    if not hasattr(socket, "AF_UNIX"):
+        _emit({"error": "The agent needs Unix domain sockets, which this platform does not support"})
+        return 1
+    if os.path.exists(socket_path):
+        if _agent_running(socket_path):
+            _emit({"error": f"An agent is already listening on {socket_path}"})
+            return 1
+        os.remove(socket_path)  # Left behind by an agent that crashed
+
+    agent = VaultAgent(socket_path, idle_timeout, request_timeout)
+    try:
+        asyncio.run(agent.serve())
+    finally:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        agent._vault_thread.shutdown(wait=False)
+    return 0
+
+
+class AgentClient:
+    """Client for a running agent. Keeps one connection open across requests.
+
+        with AgentClient() as agent:
+            password = agent.request("get", website="github.com")[0]["password"]
+    """
+
+    def __init__(self, socket_path=AGENT_SOCKET, timeout=AGENT_REQUEST_TIMEOUT + 1):
+        import socket
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        self._socket.connect(socket_path)
+        self._stream = self._socket.makefile("rwb")
+
+    def request(self, command, **params):
+        """Send one command. Returns its list of results (or status dict); raises CommandError on failure."""
+        import json
+        self._stream.write(json.dumps(dict(params, command=command)).encode() + b"\n")
+        self._stream.flush()
+        line = self._stream.readline()
+        if not line:
+            raise ConnectionError("The agent closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            raise CommandError(response["error"])
+        return response.get("results", response)
+
+    def close(self):
+        self._stream.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def agent_request(command, socket_path=AGENT_SOCKET, **params):
+    """Send a single command to the agent and return its results."""
+    with AgentClient(socket_path) as agent:
+        return agent.request(command, **params)
+
+# ============================================
+# RUN PROGRAM
+# ============================================
+def run(argv=None):
+    """Start the program: the interactive menu, or a subcommand when arguments are given."""
+    arguments = configure_profiling(sys.argv[1:] if argv is None else argv)
+    if arguments:
+        sys.exit(run_cli(arguments))
+    main()
+
+
+if __name__ == "__main__":
+    run()